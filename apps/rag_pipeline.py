@@ -11,12 +11,28 @@ Author: Z3ROX - AI Security Platform
 """
 
 import os
+import sys
 import json
-import hashlib
+import mmap
+import time
+import random
+import sqlite3
+import threading
+from array import array
 from typing import List, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
+# Chunking and ingestion shared with rag-api: ships next to this script
+# (container image), or is picked up from the rag-api manifests in a repo checkout
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                             "argocd", "applications", "ai", "rag-api", "manifests"))
+from ingestion import (
+    IngestPipeline, QdrantPointsMixin, chunk_hash, chunk_text, expand_inputs, get_tokenizer,
+    print_ingest_summary, source_name
+)
+
 
 # =============================================================================
 # Configuration
@@ -38,8 +54,22 @@ class Config:
     # RAG parameters
     chunk_size: int = int(os.getenv("CHUNK_SIZE", "1000"))
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "100"))
+    # Unit of CHUNK_SIZE/CHUNK_OVERLAP: "" = characters, "regex" or "hf:<model>" = embedding tokens
+    chunk_tokenizer: str = os.getenv("CHUNK_TOKENIZER", "")
     top_k: int = int(os.getenv("TOP_K", "3"))
     
+    # Batched embeddings
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    embed_concurrency: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    
+    # Streaming ingestion (memory stays bounded by these, not by file size)
+    read_block_size: int = int(os.getenv("READ_BLOCK_SIZE", str(1024 * 1024)))  # bytes per read
+    upsert_batch_size: int = int(os.getenv("UPSERT_BATCH_SIZE", "256"))  # points per Qdrant request
+    
+    # Persistent embedding store for ingestion (max entries 0 disables)
+    embedding_store_dir: str = os.getenv("EMBEDDING_STORE_DIR", os.path.expanduser("~/.cache/rag_pipeline/embeddings"))
+    embedding_store_max_entries: int = int(os.getenv("EMBEDDING_STORE_MAX_ENTRIES", "500000"))
+    
     # Vector dimensions (nomic-embed-text = 768)
     vector_size: int = 768
 
@@ -47,6 +77,203 @@ class Config:
 config = Config()
 
 
+# =============================================================================
+# Embedding Store
+# =============================================================================
+
+class EmbeddingStore:
+    """
+    Persistent on-disk cache of chunk embeddings keyed by (model, chunk hash).
+    
+    Vectors live in memory-mapped float32 files, one per dimension
+    (vectors-<dim>.f32, fixed-size slots); a sqlite3 index maps each key to
+    its slot and last use. Beyond `max_entries` the least recently used
+    entries are evicted and their slots reused, so disk usage stays bounded
+    at roughly max_entries * dim * 4 bytes. Survives `clear` and is shared
+    across collections.
+    """
+    
+    MIN_GROWTH = 1024  # slots added when a vector file grows
+    
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._maps = {}  # dim -> (file, mmap)
+        self.hits = 0
+        self.misses = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,
+                slot INTEGER NOT NULL, last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL, PRIMARY KEY (dim, slot));
+            CREATE TABLE IF NOT EXISTS files (dim INTEGER PRIMARY KEY, next_slot INTEGER NOT NULL);
+        """)
+    
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return chunk_hash(f"{model}\0{text}")
+    
+    def _map(self, dim: int, min_slots: int = 0) -> mmap.mmap:
+        """mmap of the dim's vector file, grown to hold at least `min_slots` slots"""
+        path = os.path.join(self.directory, f"vectors-{dim}.f32")
+        slot_bytes = dim * 4
+        f, mm = self._maps.get(dim, (None, None))
+        if f is None:
+            f = open(path, "a+b")
+        
+        size = os.fstat(f.fileno()).st_size
+        if size < min_slots * slot_bytes:
+            # Double, but never far past what max_entries can occupy
+            slots = min(max(size // slot_bytes * 2, self.MIN_GROWTH), self.max_entries + self.MIN_GROWTH)
+            size = max(min_slots, slots) * slot_bytes
+            f.truncate(size)
+        if mm is None or len(mm) != size:
+            if mm is not None:
+                mm.close()
+            mm = mmap.mmap(f.fileno(), size) if size else None
+        
+        self._maps[dim] = (f, mm)
+        return mm
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for texts (None where missing)"""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for offset in range(0, len(keys), 500):
+                batch = keys[offset:offset + 500]
+                rows = self._db.execute(
+                    f"SELECT key, dim, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, dim, slot in rows:
+                    mm = self._map(dim, slot + 1)
+                    found[key] = array("f", mm[slot * dim * 4:(slot + 1) * dim * 4]).tolist()
+            if found:
+                now = time.time()
+                # One transaction, not one autocommit per row
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key in found])
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+    
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors, evicting least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                new = {}
+                for text, vector in zip(texts, vectors):
+                    key = self.key(model, text)
+                    if not self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                        new[key] = vector
+                # Make room first, so freed slots are reused and the files never
+                # outgrow the bound; a batch larger than the store keeps its tail
+                new = dict(list(new.items())[-self.max_entries:]) if self.max_entries > 0 else {}
+                self._evict(self.max_entries - len(new))
+                for key, vector in new.items():
+                    dim = len(vector)
+                    slot = self._allocate(dim)
+                    mm = self._map(dim, slot + 1)
+                    mm[slot * dim * 4:(slot + 1) * dim * 4] = array("f", vector).tobytes()
+                    self._db.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", (key, model, dim, slot, now))
+                for _, mm in self._maps.values():
+                    if mm is not None:
+                        mm.flush()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+    
+    def _allocate(self, dim: int) -> int:
+        row = self._db.execute("SELECT slot FROM free_slots WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM free_slots WHERE dim = ? AND slot = ?", (dim, row[0]))
+            return row[0]
+        row = self._db.execute("SELECT next_slot FROM files WHERE dim = ?", (dim,)).fetchone()
+        slot = row[0] if row else 0
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (dim, slot + 1))
+        return slot
+    
+    def _evict(self, max_entries: int, older_than: float = None) -> int:
+        """Free the slots of LRU entries beyond max_entries (and of entries unused since older_than)"""
+        victims = []
+        if older_than is not None:
+            victims += self._db.execute("SELECT key, dim, slot FROM entries WHERE last_used < ?", (older_than,)).fetchall()
+        excess = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - len(victims) - max_entries
+        if excess > 0:
+            victims += self._db.execute(
+                "SELECT key, dim, slot FROM entries WHERE last_used >= ? ORDER BY last_used LIMIT ?",
+                (older_than or 0, excess)
+            ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _, _ in victims])
+        self._db.executemany("INSERT OR IGNORE INTO free_slots VALUES (?, ?)", [(dim, slot) for _, dim, slot in victims])
+        return len(victims)
+    
+    def prune(self, max_entries: int = None, older_than_days: float = None) -> int:
+        """Evict down to max_entries (default: the configured limit) and/or entries unused for N days"""
+        older_than = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._evict(self.max_entries if max_entries is None else max_entries, older_than)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return removed
+    
+    def clear(self):
+        """Remove all entries and vector files"""
+        with self._lock:
+            for f, mm in self._maps.values():
+                if mm is not None:
+                    mm.close()
+                f.close()
+            self._maps = {}
+            self._db.executescript("""
+                DELETE FROM entries; DELETE FROM free_slots; DELETE FROM files;
+                VACUUM; PRAGMA wal_checkpoint(TRUNCATE);
+            """)
+            for name in os.listdir(self.directory):
+                if name.startswith("vectors-") and name.endswith(".f32"):
+                    os.unlink(os.path.join(self.directory, name))
+    
+    def stats(self) -> dict:
+        with self._lock:
+            models = dict(self._db.execute("SELECT model, COUNT(*) FROM entries GROUP BY model").fetchall())
+            free = self._db.execute("SELECT COUNT(*) FROM free_slots").fetchone()[0]
+        disk = sum(
+            os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+            if name.startswith("vectors-") or name.startswith("index.sqlite3")
+        )
+        return {
+            "directory": self.directory,
+            "entries": sum(models.values()),
+            "max_entries": self.max_entries,
+            "models": models,
+            "free_slots": free,
+            "disk_mb": round(disk / 1e6, 2),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
 # =============================================================================
 # Ollama Client
 # =============================================================================
@@ -54,8 +281,10 @@ config = Config()
 class OllamaClient:
     """Client for Ollama API (embeddings + chat)"""
     
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, store: EmbeddingStore = None):
         self.base_url = base_url.rstrip("/")
+        self.store = store
+        self._batch_endpoint = True  # /api/embed (multi-input), disabled on 404
     
     def embed(self, text: str, model: str = None) -> List[float]:
         """Generate embedding for text"""
@@ -67,9 +296,65 @@ class OllamaClient:
         response.raise_for_status()
         return response.json()["embedding"]
     
-    def embed_batch(self, texts: List[str], model: str = None) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        return [self.embed(text, model) for text in texts]
+    def embed_batch(self, texts: List[str], model: str = None, timings: list = None) -> List[List[float]]:
+        """
+        Generate embeddings for multiple texts (order preserved).
+        
+        Texts are sent EMBED_BATCH_SIZE at a time to the multi-input /api/embed
+        endpoint. Older Ollama servers without it fall back to EMBED_CONCURRENCY
+        parallel /api/embeddings calls. Per-batch timings are appended to
+        `timings` when a list is given.
+        
+        With an EmbeddingStore, stored vectors are reused and only the
+        missing texts are sent to Ollama (then stored).
+        """
+        model = model or config.embedding_model
+        batch_size = max(1, config.embed_batch_size)
+        embeddings = [None] * len(texts)
+        missing = list(range(len(texts)))
+        
+        if self.store is not None and texts:
+            start = time.time()
+            embeddings = self.store.get_many(model, texts)
+            missing = [i for i, vector in enumerate(embeddings) if vector is None]
+            if timings is not None and len(missing) < len(texts):
+                timings.append({"size": len(texts) - len(missing), "mode": "store",
+                                "latency_ms": (time.time() - start) * 1000})
+        
+        for offset in range(0, len(missing), batch_size):
+            indexes = missing[offset:offset + batch_size]
+            batch = [texts[i] for i in indexes]
+            start = time.time()
+            vectors, mode = self._embed_batch_request(batch, model)
+            latency = (time.time() - start) * 1000
+            
+            for i, vector in zip(indexes, vectors):
+                embeddings[i] = vector
+            if self.store is not None:
+                self.store.put_many(model, batch, vectors)
+            if timings is not None:
+                timings.append({"size": len(batch), "mode": mode, "latency_ms": latency})
+        
+        return embeddings
+    
+    def _embed_batch_request(self, batch: List[str], model: str):
+        """Embed one batch, returns (vectors, mode)"""
+        if self._batch_endpoint:
+            response = requests.post(
+                f"{self.base_url}/api/embed",
+                json={"model": model, "input": batch}
+            )
+            # Unknown route (old Ollama) vs. unknown model: only the former falls back
+            if response.status_code == 404 and "model" not in response.text:
+                print("   → /api/embed not available, falling back to /api/embeddings")
+                self._batch_endpoint = False
+            else:
+                response.raise_for_status()
+                return response.json()["embeddings"], "batch"
+        
+        workers = max(1, min(config.embed_concurrency, len(batch)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda text: self.embed(text, model), batch)), "fanout"
     
     def chat(self, prompt: str, system: str = None, model: str = None) -> str:
         """Generate chat response"""
@@ -91,7 +376,7 @@ class OllamaClient:
 # Qdrant Client
 # =============================================================================
 
-class QdrantClient:
+class QdrantClient(QdrantPointsMixin):
     """Simple Qdrant REST API client"""
     
     def __init__(self, url: str, api_key: str = None):
@@ -168,8 +453,8 @@ class QdrantClient:
 # Text Processing
 # =============================================================================
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
-    """Split text into overlapping chunks"""
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+    """Previous chunk_text implementation, kept as the chunk-bench baseline"""
     chunks = []
     start = 0
     text_len = len(text)
@@ -193,21 +478,22 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[st
     return [c for c in chunks if c]  # Remove empty chunks
 
 
-def generate_id(text: str, source: str) -> str:
-    """Generate unique ID for a chunk"""
-    content = f"{source}:{text[:100]}"
-    return hashlib.md5(content.encode()).hexdigest()
-
-
 # =============================================================================
 # RAG Pipeline
 # =============================================================================
 
+def open_embedding_store() -> Optional[EmbeddingStore]:
+    if config.embedding_store_max_entries <= 0:
+        return None
+    return EmbeddingStore(config.embedding_store_dir, config.embedding_store_max_entries)
+
+
 class RAGPipeline:
     """RAG Pipeline using Qdrant + Ollama"""
     
     def __init__(self):
-        self.ollama = OllamaClient(config.ollama_url)
+        self.store = open_embedding_store()
+        self.ollama = OllamaClient(config.ollama_url, self.store)
         self.qdrant = QdrantClient(config.qdrant_url, config.qdrant_api_key)
         self._ensure_collection()
     
@@ -218,47 +504,45 @@ class RAGPipeline:
                 config.collection_name,
                 config.vector_size
             )
+        # Re-ingestion looks up a source's points by this field
+        self.qdrant.create_payload_index(config.collection_name, "source")
     
-    def ingest_text(self, text: str, source: str, metadata: dict = None):
-        """Ingest text into the vector database"""
+    def ingest_text(self, text: str, source: str, metadata: dict = None) -> dict:
+        """Ingest text into the vector database (see ingest_files), returns the summary"""
         print(f"📄 Ingesting: {source}")
+        return self._checked(IngestPipeline(config, self.ollama.embed_batch, self.qdrant).run_text(text, source, metadata))
+    
+    def ingest_file(self, filepath: str, metadata: dict = None, source: str = None) -> dict:
+        """
+        Ingest a file into the vector database (source: default the file name).
         
-        # Chunk the text
-        chunks = chunk_text(text, config.chunk_size, config.chunk_overlap)
-        print(f"   → {len(chunks)} chunks")
-        
-        # Generate embeddings
-        print(f"   → Generating embeddings...")
-        embeddings = self.ollama.embed_batch(chunks)
-        
-        # Prepare points
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            point_id = generate_id(chunk, source)
-            payload = {
-                "text": chunk,
-                "source": source,
-                "chunk_index": i,
-                **(metadata or {})
-            }
-            points.append({
-                "id": point_id,
-                "vector": embedding,
-                "payload": payload
-            })
-        
-        # Upsert to Qdrant
-        self.qdrant.upsert_points(config.collection_name, points)
-        print(f"   → Stored {len(points)} vectors in Qdrant")
-    
-    def ingest_file(self, filepath: str, metadata: dict = None):
-        """Ingest a file into the vector database"""
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
+        The file is streamed through the IngestPipeline like ingest_files
+        does, so memory stays constant regardless of file size.
+        """
+        source = source or source_name(filepath)
+        print(f"📄 Ingesting: {source} ({os.path.getsize(filepath) / 1e6:.1f} MB)")
+        pipeline = IngestPipeline(config, self.ollama.embed_batch, self.qdrant)
+        return self._checked(pipeline.run([(filepath, source)], metadata))
+    
+    @staticmethod
+    def _checked(summary: dict) -> dict:
+        """Single-document ingests raise instead of returning a failure (already rolled back)"""
+        if summary["failed"]:
+            name, error = next(iter(summary["failed"].items()))
+            raise RuntimeError(f"Ingest failed: {name}: {error}")
+        return summary
+    
+    def ingest_files(self, paths: List[str], workers: int = 1) -> dict:
+        """
+        Ingest files, directories and glob patterns, returns a throughput summary.
         
-        source = os.path.basename(filepath)
-        file_metadata = {"filepath": filepath, **(metadata or {})}
-        self.ingest_text(text, source, file_metadata)
+        Files are streamed through the shared IngestPipeline with `workers`
+        readers/embedders; only new or changed chunks are embedded, and a
+        file that fails is rolled back to its previous points.
+        """
+        inputs = expand_inputs(paths)
+        print(f"🚀 Ingesting {len(inputs)} files with {max(1, workers)} workers")
+        return IngestPipeline(config, self.ollama.embed_batch, self.qdrant, workers).run(inputs)
     
     def search(self, query: str, top_k: int = None) -> List[dict]:
         """Search for relevant chunks"""
@@ -348,6 +632,73 @@ Answer based on the context above:"""
         print(f"🗑️ Cleared collection: {config.collection_name}")
 
 
+# =============================================================================
+# Chunking Benchmark
+# =============================================================================
+
+def synthetic_corpus(size_mb: float, seed: int = 0) -> str:
+    """Deterministic prose-like text: sentences, paragraphs and some long unbroken lines"""
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 12))) for _ in range(5000)]
+    parts = []
+    size = 0
+    while size < size_mb * 1e6:
+        if rng.random() < 0.05:
+            # log/code-like line without sentence boundaries
+            part = "-".join(rng.choice(vocab) for _ in range(rng.randint(50, 400))) + "\n"
+        else:
+            sentences = [
+                " ".join(rng.choice(vocab) for _ in range(rng.randint(4, 30))).capitalize() + "."
+                for _ in range(rng.randint(1, 8))
+            ]
+            part = " ".join(sentences) + "\n\n"
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def run_chunk_benchmark(paths: List[str], size_mb: float, chunk_size: int, overlap: int, tokenizer_spec: str):
+    """Compare legacy_chunk_text with TextChunker (characters and tokens) on a corpus"""
+    if paths:
+        texts = []
+        for filepath, _ in expand_inputs(paths):
+            with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+                texts.append(f.read())
+        text = "\n".join(texts)
+        corpus = f"{len(texts)} files"
+    else:
+        text = synthetic_corpus(size_mb)
+        corpus = "synthetic"
+    tokenizer = get_tokenizer(tokenizer_spec or "regex")
+    mb = len(text.encode()) / 1e6
+    print(f"📏 Corpus: {corpus}, {mb:.1f} MB, chunk_size={chunk_size}, overlap={overlap}")
+    
+    engines = [("TextChunker (chars)", lambda: chunk_text(text, chunk_size, overlap)),
+               (f"TextChunker (tokens: {tokenizer_spec or 'regex'})",
+                lambda: chunk_text(text, chunk_size, overlap, tokenizer))]
+    if overlap <= chunk_size // 2:
+        engines.insert(0, ("legacy chunk_text", lambda: legacy_chunk_text(text, chunk_size, overlap)))
+    else:
+        print("   legacy chunk_text skipped: overlap > chunk_size / 2 may never terminate")
+    
+    results = {}
+    print(f"\n{'engine':<34} {'seconds':>8} {'MB/s':>8} {'chunks':>8} {'avg tok':>8} {'max tok':>8}")
+    for name, run in engines:
+        start = time.time()
+        chunks = run()
+        elapsed = time.time() - start
+        results[name] = chunks
+        tokens = [len(tokenizer(chunk)) for chunk in chunks] or [0]
+        print(f"{name:<34} {elapsed:>8.2f} {mb / max(elapsed, 1e-9):>8.1f} {len(chunks):>8} "
+              f"{sum(tokens) / len(tokens):>8.0f} {max(tokens):>8}")
+    
+    if "legacy chunk_text" in results:
+        legacy, new = results["legacy chunk_text"], results["TextChunker (chars)"]
+        same = sum(1 for a, b in zip(legacy, new) if a == b)
+        print(f"\nChar-mode chunks identical to legacy: {same}/{len(legacy)} "
+              f"(legacy: {len(legacy) - len(new):+d} chunks from trailing duplicates / sub-chunk_size/4 steps)")
+
+
 # =============================================================================
 # CLI Interface
 # =============================================================================
@@ -361,7 +712,9 @@ def main():
     
     # Ingest command
     ingest_parser = subparsers.add_parser("ingest", help="Ingest documents")
-    ingest_parser.add_argument("files", nargs="+", help="Files to ingest")
+    ingest_parser.add_argument("files", nargs="+", help="Files, directories or glob patterns to ingest")
+    ingest_parser.add_argument("-w", "--workers", "--parallel", type=int, default=1,
+                               help="Pipelined parallel ingestion with N workers")
     
     # Query command
     query_parser = subparsers.add_parser("query", help="Query the RAG")
@@ -382,21 +735,49 @@ def main():
     # Interactive command
     subparsers.add_parser("interactive", help="Interactive chat mode")
     
+    # Embedding store command
+    cache_parser = subparsers.add_parser("cache", help="Inspect or prune the persistent embedding store")
+    cache_parser.add_argument("action", choices=["stats", "prune", "clear"])
+    cache_parser.add_argument("--max-entries", type=int, help="prune: keep at most N entries (LRU)")
+    cache_parser.add_argument("--older-than-days", type=float, help="prune: drop entries unused for N days")
+    
+    # Chunking benchmark command
+    bench_parser = subparsers.add_parser("chunk-bench", help="Benchmark chunking engines on a corpus")
+    bench_parser.add_argument("files", nargs="*", help="Corpus files/directories/globs (default: synthetic)")
+    bench_parser.add_argument("--size-mb", type=float, default=50, help="Synthetic corpus size")
+    bench_parser.add_argument("--chunk-size", type=int, default=config.chunk_size)
+    bench_parser.add_argument("--overlap", type=int, default=config.chunk_overlap)
+    bench_parser.add_argument("--tokenizer", default=config.chunk_tokenizer, help='"regex" or "hf:<model>"')
+    
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return
     
+    if args.command == "chunk-bench":
+        run_chunk_benchmark(args.files, args.size_mb, args.chunk_size, args.overlap, args.tokenizer)
+        return
+    
+    if args.command == "cache":
+        store = open_embedding_store()
+        if store is None:
+            print("Embedding store disabled (EMBEDDING_STORE_MAX_ENTRIES=0)")
+        elif args.action == "prune":
+            removed = store.prune(args.max_entries, args.older_than_days)
+            print(f"🧹 Pruned {removed} embeddings")
+        elif args.action == "clear":
+            store.clear()
+            print(f"🗑️ Cleared embedding store: {store.directory}")
+        if store is not None:
+            print(json.dumps(store.stats(), indent=2))
+        return
+    
     # Initialize pipeline
     rag = RAGPipeline()
     
     if args.command == "ingest":
-        for filepath in args.files:
-            if os.path.exists(filepath):
-                rag.ingest_file(filepath)
-            else:
-                print(f"❌ File not found: {filepath}")
+        print_ingest_summary(rag.ingest_files(args.files, args.workers))
     
     elif args.command == "query":
         result = rag.query(args.question, args.top_k)
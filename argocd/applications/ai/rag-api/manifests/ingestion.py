@@ -0,0 +1,694 @@
+"""
+Document chunking and file ingestion shared by the RAG API (rag_api.py)
+and the RAG pipeline CLI (apps/rag_pipeline.py).
+
+Deployed next to rag_api.py (same ConfigMap); the CLI imports it from this
+directory when run from a repo checkout.
+
+Author: Z3ROX - AI Security Platform
+"""
+
+import os
+import re
+import glob
+import time
+import uuid
+import queue
+import bisect
+import codecs
+import hashlib
+import logging
+import functools
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# Tokenizers
+# =============================================================================
+
+TOKEN_PATTERN = re.compile(r"\w{1,6}|[^\w\s]")
+
+
+def regex_token_starts(text: str) -> List[int]:
+    """
+    Offsets of approximate embedding-model tokens: words are counted in
+    pieces of up to 6 characters plus one token per punctuation mark, which
+    errs on the side of more tokens than WordPiece (nomic-embed-text) produces.
+    """
+    return [match.start() for match in TOKEN_PATTERN.finditer(text)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(spec: str) -> Optional[Callable[[str], List[int]]]:
+    """
+    Tokenizer for CHUNK_TOKENIZER: "" → None (sizes in characters), "regex"
+    → regex_token_starts, "hf:<name>" → a Hugging Face `tokenizers` model.
+    A tokenizer maps text to the start offsets of its tokens.
+    """
+    if not spec:
+        return None
+    if spec == "regex":
+        return regex_token_starts
+    if spec.startswith("hf:"):
+        try:
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError(f"CHUNK_TOKENIZER={spec} requires: pip install tokenizers")
+        tokenizer = Tokenizer.from_pretrained(spec[3:])
+        return lambda text: [start for start, _ in tokenizer.encode(text, add_special_tokens=False).offsets]
+    raise ValueError(f"Unknown CHUNK_TOKENIZER: {spec}")
+
+
+# =============================================================================
+# Chunking
+# =============================================================================
+
+class _TokenUnits:
+    """Size units = tokens; index(pos) = tokens starting before pos"""
+    
+    def __init__(self, starts: List[int], text_len: int):
+        self.starts = starts
+        self.count = len(starts)
+        self.text_len = text_len
+    
+    def index(self, pos: int) -> int:
+        return bisect.bisect_left(self.starts, pos)
+    
+    def position(self, index: int) -> int:
+        return self.starts[index] if index < self.count else self.text_len
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_overlap(chunk_size: int, overlap: int):
+    logger.warning(
+        f"CHUNK_OVERLAP={overlap} > CHUNK_SIZE/4: chunks always advance by at least "
+        f"{max(1, chunk_size // 4)} units, so the overlap after a sentence break can be "
+        f"smaller than configured"
+    )
+
+
+class TextChunker:
+    """
+    Overlapping chunks of at most `chunk_size` units (characters, or tokens
+    when a tokenizer is given), preferring to end after the last ". " or
+    newline past the middle of the window.
+    
+    Token offsets are computed once per text; per chunk the boundary search
+    is two bounded str.rfind calls (no window copy) plus a few bisects, and
+    only the emitted chunk is sliced. Every chunk advances the start by at
+    least chunk_size / 4 units, so the total work is linear in the text
+    size and an overlap close to chunk_size can neither stall nor flood the
+    output with near-duplicate chunks.
+    
+    That minimum step caps the effective overlap: with overlap above
+    chunk_size / 4, a chunk cut at a sentence break shortly past the middle
+    overlaps the next one by less than `overlap` (a warning is logged once).
+    """
+    
+    def __init__(self, chunk_size: int = 1000, overlap: int = 100,
+                 tokenizer: Callable[[str], List[int]] = None):
+        self.chunk_size = max(1, chunk_size)
+        self.overlap = max(0, overlap)
+        self.tokenizer = tokenizer
+        self.min_step = max(1, self.chunk_size // 4)
+        if self.overlap > self.chunk_size // 4:
+            _warn_overlap(self.chunk_size, self.overlap)
+    
+    def split(self, text: str, final: bool = True):
+        """
+        Chunk `text`, returns (chunks, next_start). With final=False (more text
+        will follow) it stops before any chunk the following text could change,
+        and next_start is where chunking must resume.
+        """
+        if self.tokenizer is None:
+            return self._split_chars(text, final)
+        
+        units = _TokenUnits(self.tokenizer(text), len(text))
+        size, half = self.chunk_size, self.chunk_size // 2
+        lookahead = 0 if final else 1
+        chunks = []
+        start = 0
+        
+        while start < len(text):
+            first = units.index(start)
+            if first + size + lookahead >= units.count:
+                # The rest fits in one chunk
+                if not final:
+                    break
+                end = len(text)
+            else:
+                end = units.position(first + size)
+                # Last sentence/paragraph boundary inside the window, if past its middle
+                break_point = max(text.rfind(". ", start, end), text.rfind("\n", start, end))
+                if break_point >= 0 and units.index(break_point) - first > half:
+                    end = break_point + 1
+            
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= len(text):
+                return chunks, len(text)
+            start = units.position(max(units.index(end) - self.overlap, first + self.min_step))
+        
+        return chunks, start
+    
+    def _split_chars(self, text: str, final: bool):
+        """split() with character units: same algorithm, positions are units"""
+        size, half, overlap, min_step = self.chunk_size, self.chunk_size // 2, self.overlap, self.min_step
+        text_len = len(text)
+        last_start = text_len - size - (0 if final else 1)  # from here the rest fits in one chunk
+        chunks = []
+        start = 0
+        
+        while start < text_len:
+            if start >= last_start:
+                if not final:
+                    break
+                end = text_len
+            else:
+                end = start + size
+                break_point = max(text.rfind(". ", start, end), text.rfind("\n", start, end))
+                if break_point - start > half:
+                    end = break_point + 1
+            
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= text_len:
+                return chunks, text_len
+            start = max(end - overlap, start + min_step)
+        
+        return chunks, start
+
+
+def iter_chunks(blocks: Iterable[str], chunk_size: int = 1000, overlap: int = 100,
+                tokenizer: Callable[[str], List[int]] = None) -> Iterator[str]:
+    """
+    Split a stream of text blocks into overlapping chunks.
+    
+    Only the unconsumed tail of the text is buffered (at most one block plus
+    one chunk), so memory does not grow with the input. Yields exactly the
+    chunks chunk_text() returns for the concatenated blocks.
+    """
+    chunker = TextChunker(chunk_size, overlap, tokenizer)
+    buffer = ""
+    start = 0
+    retry_at = 0
+    
+    for block in blocks:
+        buffer = buffer[start:] + block
+        start = 0
+        # Re-split only once the unconsumed tail doubled (linear for tiny blocks)
+        if len(buffer) < retry_at:
+            continue
+        chunks, start = chunker.split(buffer, final=False)
+        yield from chunks
+        retry_at = 2 * (len(buffer) - start)
+    
+    yield from chunker.split(buffer[start:])[0]
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100,
+               tokenizer: Callable[[str], List[int]] = None) -> List[str]:
+    """Split text into overlapping chunks"""
+    return TextChunker(chunk_size, overlap, tokenizer).split(text)[0]
+
+
+# =============================================================================
+# Reading
+# =============================================================================
+
+def read_blocks(filepath: str, block_size: int = 1024 * 1024, progress: dict = None) -> Iterator[str]:
+    """
+    Read a UTF-8 file as a stream of text blocks of ~block_size bytes.
+    
+    Multi-byte characters split across blocks are handled by an incremental
+    decoder. Bytes read so far are kept in progress["bytes_read"].
+    """
+    block_size = max(1, block_size)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    
+    with open(filepath, "rb") as f:
+        while True:
+            data = f.read(block_size)
+            if progress is not None:
+                progress["bytes_read"] = progress.get("bytes_read", 0) + len(data)
+            if not data:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield tail
+                return
+            yield decoder.decode(data)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def source_name(filepath: str, root: str = None) -> str:
+    """Source of a file: its path below `root` (the directory or glob prefix given), else its name"""
+    name = os.path.relpath(filepath, root or ".") if root is not None else os.path.basename(filepath)
+    return name.replace(os.sep, "/")
+
+
+def expand_inputs(paths: List[str]) -> List[tuple]:
+    """
+    Resolve files, directories (recursively) and glob patterns to
+    de-duplicated (filepath, source) pairs.
+    
+    The source names the file's points in Qdrant (and derives their IDs),
+    so it must not depend on where the tree is checked out: files are named
+    relative to the directory or to the fixed prefix of the glob pattern
+    they were found under, plain file arguments by their basename. A file
+    whose source is already taken by another input is skipped.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                files.extend(
+                    (filepath, source_name(filepath, path))
+                    for filepath in (os.path.join(root, name) for name in sorted(names) if not name.startswith("."))
+                )
+        elif os.path.isfile(path):
+            files.append((path, source_name(path)))
+        else:
+            prefix = path
+            while glob.has_magic(prefix):
+                prefix = os.path.dirname(prefix)
+            matches = sorted(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+            if not matches:
+                print(f"❌ File not found: {path}")
+            files.extend((match, source_name(match, prefix)) for match in matches)
+    
+    inputs, listed, owners = [], set(), {}
+    for filepath, source in files:
+        if os.path.abspath(filepath) in listed:
+            continue
+        if source in owners:
+            print(f"❌ Skipping {filepath}: source '{source}' is already used by {owners[source]}")
+            continue
+        listed.add(os.path.abspath(filepath))
+        owners[source] = filepath
+        inputs.append((filepath, source))
+    return inputs
+
+
+# =============================================================================
+# Points
+# =============================================================================
+
+def chunk_hash(text: str) -> str:
+    """Content hash of a full chunk"""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def generate_id(text: str, source: str) -> str:
+    """Content-addressed chunk ID: same source + same chunk text → same ID"""
+    content = f"{source}:{chunk_hash(text)}"
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def plan_chunks(indexed_chunks: Iterable, source: str, known: Dict[str, int], seen: Dict[str, int]):
+    """
+    Diff (index, chunk) pairs of one source against its stored points.
+    
+    Returns (new, moved): new is [(index, chunk, point_id)] to embed and
+    upsert, moved is {point_id: index} for stored chunks whose position
+    changed. Every point ID is recorded in `seen`; a chunk repeated within
+    the source maps to a single point.
+    """
+    new, moved = [], {}
+    for index, chunk in indexed_chunks:
+        point_id = generate_id(chunk, source)
+        if point_id in seen:
+            continue
+        seen[point_id] = index
+        if point_id not in known:
+            new.append((index, chunk, point_id))
+        elif known[point_id] != index:
+            moved[point_id] = index
+    return new, moved
+
+
+def build_points(entries: List[tuple], embeddings: List[List[float]], source: str, metadata: dict = None) -> List[dict]:
+    """Qdrant points for (index, chunk, point_id) entries of `source`"""
+    points = []
+    for (index, chunk, point_id), embedding in zip(entries, embeddings):
+        payload = {
+            "text": chunk,
+            "source": source,
+            "chunk_index": index,
+            "chunk_hash": chunk_hash(chunk),
+            **(metadata or {})
+        }
+        points.append({
+            "id": point_id,
+            "vector": embedding,
+            "payload": payload
+        })
+    return points
+
+
+def source_scroll_query(source: str, offset=None) -> dict:
+    """Qdrant scroll request for one page of a source's point IDs and chunk indexes"""
+    return {
+        "filter": {"must": [{"key": "source", "match": {"value": source}}]},
+        "with_payload": ["chunk_index"],
+        "with_vector": False,
+        "limit": 1000,
+        "offset": offset
+    }
+
+
+def collect_source_points(result: dict, points: Dict[str, int]):
+    """Add a scroll page's {point_id: chunk_index} to `points`, returns the next page offset"""
+    for point in result.get("points", []):
+        point_id = point["id"]
+        # UUIDs come back hyphenated; generate_id returns the plain hex form
+        if isinstance(point_id, str):
+            point_id = uuid.UUID(point_id).hex
+        points[point_id] = (point.get("payload") or {}).get("chunk_index")
+    return result.get("next_page_offset")
+
+
+def stale_points(known: Dict[str, int], seen: Dict[str, int]) -> List[str]:
+    """Stored points of a source whose chunk is gone from its new content"""
+    return [point_id for point_id in known if point_id not in seen]
+
+
+class QdrantPointsMixin:
+    """Point-level operations of incremental ingestion, for a Qdrant client with _request(method, path, data)"""
+    
+    def create_payload_index(self, name: str, field: str):
+        """Index a keyword payload field (no-op if it already exists)"""
+        self._request("PUT", f"/collections/{name}/index", {
+            "field_name": field,
+            "field_schema": "keyword"
+        })
+    
+    def delete_points(self, name: str, ids: List[str]):
+        """Delete points by ID"""
+        for batch in batched(ids, 1000):
+            self._request("POST", f"/collections/{name}/points/delete", {
+                "points": batch
+            })
+    
+    def source_points(self, name: str, source: str) -> Dict[str, int]:
+        """Stored points of one source: {point_id: chunk_index}"""
+        points = {}
+        offset = None
+        while True:
+            result = self._request("POST", f"/collections/{name}/points/scroll", source_scroll_query(source, offset))
+            offset = collect_source_points(result.get("result", {}), points)
+            if offset is None:
+                return points
+    
+    def set_payloads(self, name: str, payloads: Dict[str, dict]):
+        """Merge a (different) payload into each point, in one batch request"""
+        self._request("POST", f"/collections/{name}/points/batch", {
+            "operations": [
+                {"set_payload": {"payload": payload, "points": [point_id]}}
+                for point_id, payload in payloads.items()
+            ]
+        })
+
+
+# =============================================================================
+# Pipelined Ingestion
+# =============================================================================
+
+def print_ingest_summary(summary: dict):
+    seconds = max(summary["seconds"], 1e-9)
+    print(f"\n📊 Ingested {summary['files'] - len(summary['failed'])}/{summary['files']} files, "
+          f"{summary['chunks']} chunks, {summary['bytes'] / 1e6:.1f} MB in {summary['seconds']:.1f}s")
+    print(f"   Changes: {summary['embedded']} embedded, {summary['chunks'] - summary['embedded']} unchanged "
+          f"({summary['moved']} re-indexed), {summary['deleted']} stale deleted")
+    print(f"   Throughput: {summary['chunks'] / seconds:.1f} chunks/s, {summary['bytes'] / 1e6 / seconds:.2f} MB/s")
+    for filepath, error in summary["failed"].items():
+        print(f"   ❌ {filepath}: {error}")
+
+
+class IngestPipeline:
+    """
+    Multi-file ingestion with overlapping stages:
+    
+        files → readers (read + chunk + diff) → embedders → upserter → Qdrant
+    
+    Stages are connected by bounded queues, so a slow stage applies
+    back-pressure instead of buffering: readers stream READ_BLOCK_SIZE
+    blocks and stay at most a few embed batches ahead, `workers` embed
+    requests keep the embedding server busy, and upserts of
+    UPSERT_BATCH_SIZE points run while the next batches are being embedded.
+    Readers diff chunks against the file's points already in Qdrant
+    (scrolled by source) so only new chunks reach the embedders; once a
+    file's last batch is stored its stale points are deleted.
+    
+    A file that fails in any stage is reported and skipped, and the points
+    it got in this run are deleted again, so it keeps its previous content
+    (the summary says so, or how many points were left if that fails too).
+    
+    `settings` provides collection_name, chunk_size, chunk_overlap,
+    chunk_tokenizer, read_block_size, embed_batch_size and
+    upsert_batch_size; `embed` maps texts to vectors; `qdrant` is a client
+    with upsert_points plus the QdrantPointsMixin operations.
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, settings, embed: Callable[[List[str]], List[List[float]]], qdrant,
+                 workers: int = 1, queue_depth: int = None):
+        self.settings = settings
+        self.embed = embed
+        self.qdrant = qdrant
+        self.workers = max(1, workers)
+        depth = queue_depth or self.workers * 2
+        self._files = queue.Queue()
+        self._batches = queue.Queue(maxsize=depth)
+        self._points = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._state = {}
+        self.chunks = {}
+        self.failed = {}
+        self.bytes_read = 0
+        self.embedded = 0
+        self.moved = 0
+        self.deleted = 0
+    
+    def _fail(self, filepath: str, error: Exception):
+        with self._lock:
+            if filepath not in self.failed:
+                self.failed[filepath] = f"{type(error).__name__}: {error}"
+                print(f"   ❌ {filepath}: {error}")
+    
+    def _read(self):
+        """Stage 1: stream each file into embed-sized batches of new chunks"""
+        settings = self.settings
+        embed_batch_size = max(1, settings.embed_batch_size)
+        while True:
+            try:
+                filepath, source, metadata, open_blocks = self._files.get_nowait()
+            except queue.Empty:
+                return
+            
+            state = {"source": source, "known": {}, "seen": {}, "pending": 0, "read_done": False,
+                     "embedded": 0, "upserted": []}
+            with self._lock:
+                self._state[filepath] = state
+            
+            progress = {"bytes_read": 0}
+            try:
+                state["known"] = self.qdrant.source_points(settings.collection_name, source)
+                chunks = iter_chunks(open_blocks(progress), settings.chunk_size, settings.chunk_overlap,
+                                     get_tokenizer(settings.chunk_tokenizer))
+                new, moved = [], {}
+                for batch in batched(enumerate(chunks), embed_batch_size):
+                    batch_new, batch_moved = plan_chunks(batch, source, state["known"], state["seen"])
+                    new += batch_new
+                    moved.update(batch_moved)
+                    if len(new) >= embed_batch_size or len(moved) >= embed_batch_size:
+                        self._submit(filepath, source, metadata, new, moved)
+                        new, moved = [], {}
+                if new or moved:
+                    self._submit(filepath, source, metadata, new, moved)
+            except Exception as e:
+                self._fail(filepath, e)
+            
+            with self._lock:
+                self.bytes_read += progress["bytes_read"]
+                state["read_done"] = True
+                finished = state["pending"] == 0
+            if finished:
+                self._finish(filepath)
+    
+    def _submit(self, filepath: str, source: str, metadata: dict, new: list, moved: dict):
+        with self._lock:
+            self._state[filepath]["pending"] += 1
+        self._batches.put((filepath, source, metadata, new, moved))
+    
+    def _embed(self):
+        """Stage 2: embed new chunks into points"""
+        while True:
+            item = self._batches.get()
+            if item is self._DONE:
+                self._points.put(self._DONE)
+                return
+            
+            filepath, source, metadata, new, moved = item
+            if filepath in self.failed:
+                continue
+            try:
+                embeddings = self.embed([chunk for _, chunk, _ in new]) if new else []
+            except Exception as e:
+                self._fail(filepath, e)
+                continue
+            self._points.put((filepath, build_points(new, embeddings, source, metadata), moved))
+    
+    def _upsert(self):
+        """Stage 3: write points to Qdrant UPSERT_BATCH_SIZE at a time"""
+        pending = []
+        remaining = self.workers
+        upsert_batch_size = max(1, self.settings.upsert_batch_size)
+        
+        while remaining:
+            item = self._points.get()
+            if item is self._DONE:
+                remaining -= 1
+            else:
+                pending.append(item)
+            
+            size = sum(len(points) + len(moved) for _, points, moved in pending)
+            if pending and (not remaining or size >= upsert_batch_size):
+                self._flush(pending)
+                pending = []
+    
+    def _flush(self, pending: list):
+        collection = self.settings.collection_name
+        live = [item for item in pending if item[0] not in self.failed]
+        points = [point for _, batch, _ in live for point in batch]
+        payloads = {point_id: {"chunk_index": index} for _, _, moved in live for point_id, index in moved.items()}
+        # Recorded before the request: a failed upsert may still have been partly applied
+        for filepath, batch, _ in live:
+            self._state[filepath]["upserted"].extend(point["id"] for point in batch)
+        try:
+            if points:
+                self.qdrant.upsert_points(collection, points)
+            if payloads:
+                self.qdrant.set_payloads(collection, payloads)
+        except Exception as e:
+            for filepath, _, _ in live:
+                self._fail(filepath, e)
+            return
+        
+        finished = []
+        with self._lock:
+            for filepath, batch, moved in live:
+                state = self._state[filepath]
+                state["embedded"] += len(batch)
+                state["pending"] -= 1
+                if state["read_done"] and state["pending"] == 0:
+                    finished.append(filepath)
+            self.embedded += len(points)
+            self.moved += len(payloads)
+            print(f"   → {self.embedded} chunks embedded, {self.moved} re-indexed ({self.bytes_read / 1e6:.1f} MB read)")
+        
+        for filepath in finished:
+            self._finish(filepath)
+    
+    def _finish(self, filepath: str):
+        """All batches of a file are stored: delete its stale points"""
+        if filepath in self.failed:
+            return
+        state = self._state[filepath]
+        stale = stale_points(state["known"], state["seen"])
+        try:
+            if stale:
+                self.qdrant.delete_points(self.settings.collection_name, stale)
+        except Exception as e:
+            self._fail(filepath, e)
+            return
+        
+        with self._lock:
+            self.deleted += len(stale)
+            self.chunks[filepath] = len(state["seen"])
+    
+    def _rollback(self, filepath: str):
+        """Delete the points a failed file got in this run, its previous points stay"""
+        state = self._state.get(filepath)
+        upserted = state["upserted"] if state else []
+        if not upserted:
+            return
+        try:
+            self.qdrant.delete_points(self.settings.collection_name, upserted)
+            self.failed[filepath] += f" (rolled back {len(upserted)} new points)"
+        except Exception as e:
+            self.failed[filepath] += f" (partial ingest: {len(upserted)} new points left in Qdrant, rollback failed: {e})"
+        self.embedded -= state["embedded"]
+    
+    def run(self, inputs: List[tuple], metadata: dict = None) -> dict:
+        """Ingest (filepath, source) pairs, returns the throughput summary"""
+        block_size = self.settings.read_block_size
+        return self._run([
+            (filepath, source, {"filepath": filepath, **(metadata or {})},
+             functools.partial(read_blocks, filepath, block_size))
+            for filepath, source in inputs
+        ])
+    
+    def run_text(self, text: str, source: str, metadata: dict = None) -> dict:
+        """Ingest an in-memory text as `source` (reported under that name)"""
+        def blocks(progress: dict) -> List[str]:
+            progress["bytes_read"] = len(text.encode())
+            return [text]
+        
+        return self._run([(source, source, metadata or {}, blocks)])
+    
+    def _run(self, items: List[tuple]) -> dict:
+        """Ingest (name, source, metadata, open_blocks(progress)) items"""
+        start = time.time()
+        files = [item[0] for item in items]
+        for item in items:
+            self._files.put(item)
+        
+        readers = [threading.Thread(target=self._read, daemon=True) for _ in range(min(self.workers, len(files)))]
+        embedders = [threading.Thread(target=self._embed, daemon=True) for _ in range(self.workers)]
+        upserter = threading.Thread(target=self._upsert, daemon=True)
+        for thread in readers + embedders + [upserter]:
+            thread.start()
+        
+        for thread in readers:
+            thread.join()
+        for _ in embedders:
+            self._batches.put(self._DONE)
+        for thread in embedders + [upserter]:
+            thread.join()
+        
+        for filepath in list(self.failed):
+            self._rollback(filepath)
+        
+        for filepath in files:
+            if filepath not in self.failed:
+                print(f"✅ {filepath}: {self.chunks.get(filepath, 0)} chunks, "
+                      f"{self._state[filepath]['embedded']} embedded")
+        
+        return {
+            "files": len(files),
+            "chunks": sum(self.chunks.values()),
+            "embedded": self.embedded,
+            "moved": self.moved,
+            "deleted": self.deleted,
+            "bytes": self.bytes_read,
+            "seconds": time.time() - start,
+            "failed": self.failed
+        }
@@ -14,17 +14,34 @@ Author: Z3ROX - AI Security Platform
 """
 
 import os
+import re
+import json
+import time
+import asyncio
 import hashlib
 import logging
-from typing import List, Optional
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
 from dataclasses import dataclass
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ingestion import (
+    IngestPipeline, QdrantPointsMixin, batched, build_points, chunk_text, collect_source_points,
+    expand_inputs, get_tokenizer, plan_chunks, print_ingest_summary, source_scroll_query, stale_points
+)
 
 # FastAPI imports
 try:
     from fastapi import FastAPI, HTTPException
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, StreamingResponse
     from pydantic import BaseModel
+    import httpx
     FASTAPI_AVAILABLE = True
 except ImportError:
     FASTAPI_AVAILABLE = False
@@ -32,6 +49,7 @@ except ImportError:
 # Configure logging
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # per-request INFO lines
 
 # =============================================================================
 # Configuration
@@ -53,42 +71,751 @@ class Config:
     # RAG settings
     chunk_size: int = int(os.getenv("CHUNK_SIZE", "1000"))
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "100"))
+    # Unit of CHUNK_SIZE/CHUNK_OVERLAP: "" = characters, "regex" or "hf:<model>" = embedding tokens
+    chunk_tokenizer: str = os.getenv("CHUNK_TOKENIZER", "")
     top_k: int = int(os.getenv("TOP_K", "3"))
     vector_size: int = 768  # nomic-embed-text
     
+    # Run retrieval while the input scan is in flight (discarded if blocked)
+    speculative_retrieval: bool = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+    
+    # Query embedding cache (size 0 disables; Redis URL shares it across replicas)
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+    embedding_cache_ttl: int = int(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+    embedding_cache_redis_url: str = os.getenv("EMBEDDING_CACHE_REDIS_URL", "")
+    
+    # Semantic answer cache for /query (size 0 disables). Collection changes made
+    # elsewhere are detected every REFRESH_SECONDS (Redis version key + point count)
+    semantic_cache_size: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_ttl: int = int(os.getenv("SEMANTIC_CACHE_TTL", "600"))
+    semantic_cache_refresh_seconds: float = float(os.getenv("SEMANTIC_CACHE_REFRESH_SECONDS", "5"))
+    semantic_cache_redis_url: str = os.getenv("SEMANTIC_CACHE_REDIS_URL") or os.getenv("EMBEDDING_CACHE_REDIS_URL", "")
+    
+    # Streaming output scan windows (characters)
+    stream_scan_min_chars: int = int(os.getenv("STREAM_SCAN_MIN_CHARS", "80"))
+    stream_holdback_max_chars: int = int(os.getenv("STREAM_HOLDBACK_MAX_CHARS", "1000"))
+    
+    # Batched embeddings
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    embed_concurrency: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    upsert_batch_size: int = int(os.getenv("UPSERT_BATCH_SIZE", "256"))  # points per Qdrant request (CLI ingest)
+    read_block_size: int = int(os.getenv("READ_BLOCK_SIZE", str(1024 * 1024)))  # bytes per read (CLI ingest)
+    
     # Guardrails
     guardrails_url: str = os.getenv("GUARDRAILS_URL", "http://guardrails-api.ai-inference.svc.cluster.local:8000")
     guardrails_enabled: bool = os.getenv("GUARDRAILS_ENABLED", "true").lower() == "true"
+    
+    # Guardrails failure handling: "open" passes content through, "closed" blocks it
+    guardrails_input_policy: str = os.getenv("GUARDRAILS_INPUT_POLICY", "open").lower()
+    guardrails_output_policy: str = os.getenv("GUARDRAILS_OUTPUT_POLICY", "open").lower()
+    
+    # Guardrails circuit breaker + adaptive timeout (GUARDRAILS_TIMEOUT is the ceiling)
+    guardrails_breaker_failures: int = int(os.getenv("GUARDRAILS_BREAKER_FAILURES", "5"))
+    guardrails_breaker_reset: float = float(os.getenv("GUARDRAILS_BREAKER_RESET", "30"))
+    guardrails_timeout_percentile: float = float(os.getenv("GUARDRAILS_TIMEOUT_PERCENTILE", "0.99"))
+    guardrails_timeout_multiplier: float = float(os.getenv("GUARDRAILS_TIMEOUT_MULTIPLIER", "3"))
+    guardrails_timeout_min: float = float(os.getenv("GUARDRAILS_TIMEOUT_MIN", "2"))
+    guardrails_health_ttl: float = float(os.getenv("GUARDRAILS_HEALTH_TTL", "10"))
+    
+    # HTTP connection pool (shared by all upstream clients)
+    http_pool_size: int = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    http_max_retries: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    http_backoff_factor: float = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.2"))
+    http_connect_timeout: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    
+    # Per-upstream read timeouts (seconds)
+    qdrant_timeout: float = float(os.getenv("QDRANT_TIMEOUT", "30"))
+    ollama_timeout: float = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+    ollama_chat_timeout: float = float(os.getenv("OLLAMA_CHAT_TIMEOUT", "300"))
+    guardrails_timeout: float = float(os.getenv("GUARDRAILS_TIMEOUT", "30"))
+    
+    # Max in-flight requests per upstream (async API path)
+    ollama_max_concurrency: int = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "8"))
+    ollama_chat_max_concurrency: int = int(os.getenv("OLLAMA_CHAT_MAX_CONCURRENCY", "4"))
+    qdrant_max_concurrency: int = int(os.getenv("QDRANT_MAX_CONCURRENCY", "32"))
+    guardrails_max_concurrency: int = int(os.getenv("GUARDRAILS_MAX_CONCURRENCY", "16"))
 
 
 config = Config()
 
 
+# =============================================================================
+# HTTP Connection Pool
+# =============================================================================
+
+class HTTPPool:
+    """
+    Keep-alive HTTP sessions shared by the upstream clients.
+    
+    One requests.Session per upstream (ollama, qdrant, guardrails), each with
+    its own bounded connection pool and retry policy. Connection errors
+    (request never sent) are retried for every method; 502/503/504 only for
+    idempotent methods, so a POST such as /api/chat is never replayed. Read
+    timeouts are never retried.
+    """
+    
+    RETRY_STATUSES = (502, 503, 504)
+    
+    def __init__(self, pool_size: int = 10, max_retries: int = 3, backoff_factor: float = 0.2):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+    
+    def session(self, upstream: str) -> requests.Session:
+        """Get (or create) the pooled session for an upstream"""
+        with self._lock:
+            if upstream not in self._sessions:
+                self._sessions[upstream] = self._create_session()
+            return self._sessions[upstream]
+    
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # idempotent only (no POST)
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def stats(self) -> dict:
+        """Connection reuse counters per upstream"""
+        with self._lock:
+            sessions = dict(self._sessions)
+        
+        upstreams = {}
+        for upstream, session in sessions.items():
+            new_connections = 0
+            total_requests = 0
+            # http:// and https:// are mounted on the same adapter
+            adapters = {id(a): a for a in session.adapters.values()}
+            for adapter in adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    new_connections += pool.num_connections
+                    total_requests += pool.num_requests
+            upstreams[upstream] = {
+                "requests": total_requests,
+                "new_connections": new_connections,
+                "reused_connections": max(total_requests - new_connections, 0)
+            }
+        
+        return {
+            "pool_size": self.pool_size,
+            "max_retries": self.max_retries,
+            "upstreams": upstreams
+        }
+
+
+class AsyncHTTPPool:
+    """
+    Async counterpart of HTTPPool used by the FastAPI request path.
+    
+    One httpx.AsyncClient per upstream with keep-alive connections, plus a
+    semaphore capping in-flight requests to that upstream so slow calls
+    queue on the event loop instead of pinning threadpool workers.
+    Transport retries cover connection failures only.
+    """
+    
+    def __init__(self, pool_size: int = 10, max_retries: int = 3, limits: Dict[str, int] = None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.limits = limits or {}
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._counters: Dict[str, dict] = {}
+    
+    def client(self, upstream: str) -> "httpx.AsyncClient":
+        """Get (or create) the pooled client for an upstream"""
+        if upstream not in self._clients:
+            transport = httpx.AsyncHTTPTransport(
+                retries=self.max_retries,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+            self._clients[upstream] = httpx.AsyncClient(transport=transport)
+            self._semaphores[upstream] = asyncio.Semaphore(self.limits.get(upstream, self.pool_size))
+            self._counters[upstream] = {"requests": 0, "new_connections": 0, "in_flight": 0}
+        return self._clients[upstream]
+    
+    async def request(self, upstream: str, method: str, url: str, timeout: float, **kwargs) -> "httpx.Response":
+        """Send a request through the upstream's pool, within its concurrency limit"""
+        client = self.client(upstream)
+        counters = self._counters[upstream]
+        connected = []
+        
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                connected.append(True)
+        
+        async with self._semaphores[upstream]:
+            counters["in_flight"] += 1
+            try:
+                response = await client.request(
+                    method,
+                    url,
+                    timeout=httpx.Timeout(timeout, connect=config.http_connect_timeout),
+                    extensions={"trace": trace},
+                    **kwargs
+                )
+            finally:
+                counters["in_flight"] -= 1
+        
+        counters["requests"] += 1
+        counters["new_connections"] += len(connected)
+        return response
+    
+    @asynccontextmanager
+    async def stream(self, upstream: str, method: str, url: str, timeout: float, **kwargs):
+        """Streaming variant of request(); the concurrency slot is held until the body is consumed"""
+        client = self.client(upstream)
+        counters = self._counters[upstream]
+        connected = []
+        
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                connected.append(True)
+        
+        async with self._semaphores[upstream]:
+            counters["in_flight"] += 1
+            try:
+                async with client.stream(
+                    method,
+                    url,
+                    timeout=httpx.Timeout(timeout, connect=config.http_connect_timeout),
+                    extensions={"trace": trace},
+                    **kwargs
+                ) as response:
+                    counters["requests"] += 1
+                    counters["new_connections"] += len(connected)
+                    yield response
+            finally:
+                counters["in_flight"] -= 1
+    
+    def stats(self) -> dict:
+        """Connection reuse counters and concurrency per upstream"""
+        upstreams = {}
+        for upstream, counters in self._counters.items():
+            upstreams[upstream] = {
+                "requests": counters["requests"],
+                "new_connections": counters["new_connections"],
+                "reused_connections": max(counters["requests"] - counters["new_connections"], 0),
+                "in_flight": counters["in_flight"],
+                "max_concurrency": self.limits.get(upstream, self.pool_size)
+            }
+        
+        return {
+            "pool_size": self.pool_size,
+            "max_retries": self.max_retries,
+            "upstreams": upstreams
+        }
+    
+    async def aclose(self):
+        """Close all upstream clients"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+# =============================================================================
+# Query Caches (embeddings + semantic answers)
+# =============================================================================
+
+class EmbeddingCache:
+    """
+    LRU + TTL cache of query embeddings keyed by (model, normalized text).
+    
+    Vectors are kept as float32 arrays (~3 KB per 768-dim vector instead of
+    ~25 KB as a list of Python floats). When a Redis URL is configured the
+    cache is also shared across replicas; Redis errors are logged and
+    treated as misses so the cache can never fail a query.
+    """
+    
+    REDIS_PREFIX = "rag-api:embedding:"
+    
+    def __init__(self, max_size: int = 1024, ttl: int = 3600, redis_url: str = ""):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, array)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        
+        self.shared = None
+        if redis_url:
+            try:
+                import redis
+                self.shared = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            except ImportError:
+                logger.warning("EMBEDDING_CACHE_REDIS_URL set but redis is not installed, using local cache only")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode()).hexdigest()
+    
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        if not self.enabled:
+            return None
+        
+        key = self.key(model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector.tolist()
+                del self._entries[key]
+        
+        if self.shared is not None:
+            try:
+                data = self.shared.get(self.REDIS_PREFIX + key)
+            except Exception as e:
+                logger.warning(f"Shared embedding cache get failed: {e}")
+                data = None
+            if data:
+                vector = array("f")
+                vector.frombytes(data)
+                self._store(key, vector)
+                with self._lock:
+                    self.shared_hits += 1
+                return vector.tolist()
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, model: str, text: str, embedding: List[float]):
+        if not self.enabled:
+            return
+        
+        key = self.key(model, text)
+        vector = array("f", embedding)
+        self._store(key, vector)
+        
+        if self.shared is not None:
+            try:
+                self.shared.setex(self.REDIS_PREFIX + key, self.ttl, vector.tobytes())
+            except Exception as e:
+                logger.warning(f"Shared embedding cache put failed: {e}")
+    
+    def _store(self, key: str, vector: array):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "shared": self.shared is not None,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0
+            }
+
+
+class SemanticAnswerCache:
+    """
+    Cache of final /query responses keyed by question embedding.
+    
+    A new question whose embedding is within the cosine threshold of a
+    cached question (same top_k, same collection version) gets the cached,
+    already output-scanned answer instead of a new generation. Ingest and
+    clear bump the collection version, which drops every entry; answers
+    computed against an older version are never stored.
+    
+    Writes by other processes (replicas, workers, the CLI) are detected by
+    refresh(), which callers run every `refresh_interval` seconds with the
+    collection's point count: when that count or the shared version
+    counter in Redis (incremented by invalidate(), if a Redis URL is
+    configured) differs from the last refresh, the cache is invalidated.
+    Without Redis, a change that keeps the point count is only dropped by
+    the TTL.
+    """
+    
+    REDIS_VERSION_KEY = "rag-api:answers:version"
+    
+    def __init__(self, max_size: int = 256, threshold: float = 0.95, ttl: int = 600,
+                 refresh_interval: float = 5.0, redis_url: str = ""):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self._marker = None  # (shared version, point count) at the last refresh
+        self._refreshed_at = 0.0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (vector, top_k, version, expires_at, response)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        
+        self.shared = None
+        if redis_url:
+            try:
+                import redis
+                self.shared = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            except ImportError:
+                logger.warning("SEMANTIC_CACHE_REDIS_URL set but redis is not installed, using the point count only")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    def needs_refresh(self) -> bool:
+        return self.enabled and time.time() - self._refreshed_at >= self.refresh_interval
+    
+    def refresh(self, point_count: int):
+        """Invalidate if the collection changed since the last refresh (blocking Redis call)"""
+        shared_version = None
+        if self.shared is not None:
+            try:
+                shared_version = self.shared.get(self.REDIS_VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"Shared answer cache version unavailable: {e}")
+                shared_version = "unavailable"
+        
+        marker = (shared_version, point_count)
+        with self._lock:
+            changed = self._marker is not None and marker != self._marker
+            self._marker = marker
+            self._refreshed_at = time.time()
+        if changed:
+            self._drop()
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> array:
+        norm = sum(x * x for x in embedding) ** 0.5 or 1.0
+        return array("f", (x / norm for x in embedding))
+    
+    def lookup(self, embedding: List[float], top_k: int, input_scan: dict) -> Optional[dict]:
+        """
+        Best cached response above the similarity threshold, if any, with
+        the current question's `input_scan` in place of the cached one.
+        Linear scan (max_size * dim multiplications): async callers run it
+        in a worker thread.
+        """
+        if not self.enabled:
+            return None
+        
+        vector = self._normalize(embedding)
+        now = time.time()
+        best_id, best_similarity = None, self.threshold
+        with self._lock:
+            for entry_id, (cached, cached_top_k, version, expires_at, _) in list(self._entries.items()):
+                if expires_at <= now or version != self.version:
+                    del self._entries[entry_id]
+                    continue
+                if cached_top_k != top_k:
+                    continue
+                similarity = sum(map(operator.mul, vector, cached))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            
+            if best_id is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            response = self._entries[best_id][4]
+        
+        guardrails = {**response["guardrails"], "input_scan": scan_summary(input_scan)}
+        return {**response, "guardrails": guardrails, "cache": {"hit": True, "similarity": round(best_similarity, 4)}}
+    
+    def store(self, embedding: List[float], top_k: int, response: dict, version: int):
+        """Cache a response computed against collection `version`"""
+        if not self.enabled:
+            return
+        
+        vector = self._normalize(embedding)
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[self._next_id] = (vector, top_k, version, time.time() + self.ttl, response)
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self):
+        """Drop all entries after this process changed the collection, and tell the others"""
+        self._drop()
+        with self._lock:
+            self._marker = None  # our own change: the next refresh only records the new state
+        if self.shared is not None:
+            try:
+                self.shared.incr(self.REDIS_VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"Shared answer cache version not updated: {e}")
+    
+    def _drop(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self.invalidations += 1
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "shared": self.shared is not None,
+                "collection_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
 # =============================================================================
 # Guardrails Client
 # =============================================================================
 
+class CircuitOpenError(Exception):
+    """Call rejected without trying: the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker + adaptive timeout for one upstream (shared by the sync
+    and async clients of this process).
+    
+    closed: calls go through; `failure_threshold` consecutive failures open
+    the circuit. open: calls fail immediately for `reset_timeout` seconds,
+    so a saturated upstream sheds load instead of tying up every caller for
+    a full timeout. half-open: one probe call is let through; success
+    closes the circuit, failure re-opens it.
+    
+    timeout() is the `percentile` latency of recent successful calls times
+    `multiplier`, clamped to [timeout_min, timeout_max]; until enough
+    samples exist it is timeout_max.
+    """
+    
+    MIN_SAMPLES = 20
+    
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, timeout_min: float,
+                 timeout_max: float, percentile: float = 0.99, multiplier: float = 3.0, window: int = 200):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.timeout_min = timeout_min
+        self.timeout_max = timeout_max
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self._latencies: "OrderedDict[int, float]" = OrderedDict()  # ring buffer of recent latencies (s)
+        self._window = window
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.opened = 0
+    
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        with self._lock:
+            if self.state == "open" and time.time() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self._probe_in_flight = False
+            if self.state == "closed":
+                return True
+            if self.state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self, latency: float):
+        with self._lock:
+            self._seq += 1
+            self._latencies[self._seq] = latency
+            if len(self._latencies) > self._window:
+                self._latencies.popitem(last=False)
+            self._failures = 0
+            self._probe_in_flight = False
+            if self.state != "closed":
+                logger.info(f"Circuit {self.name}: closed")
+            self.state = "closed"
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                    logger.warning(f"Circuit {self.name}: open for {self.reset_timeout:.0f}s "
+                                   f"after {self._failures} failures")
+                self.state = "open"
+                self._opened_at = time.time()
+    
+    def release_probe(self):
+        """Call ended without a verdict (e.g. cancelled): free the half-open probe slot"""
+        with self._lock:
+            if self.state == "half-open":
+                self._probe_in_flight = False
+    
+    def record(self, healthy: Optional[bool], latency: float):
+        """Outcome of an allowed call; None (no verdict) only releases the probe"""
+        if healthy:
+            self.record_success(latency)
+        elif healthy is False:
+            self.record_failure()
+        else:
+            self.release_probe()
+    
+    def timeout(self) -> float:
+        """Adaptive read timeout (seconds)"""
+        with self._lock:
+            samples = sorted(self._latencies.values())
+        if len(samples) < self.MIN_SAMPLES:
+            return self.timeout_max
+        observed = samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+        return min(self.timeout_max, max(self.timeout_min, observed * self.multiplier))
+    
+    def stats(self) -> dict:
+        timeout = self.timeout()
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+                "timeout_s": timeout,
+                "latency_samples": len(self._latencies)
+            }
+
+
+guardrails_breaker = CircuitBreaker(
+    "guardrails",
+    config.guardrails_breaker_failures,
+    config.guardrails_breaker_reset,
+    config.guardrails_timeout_min,
+    config.guardrails_timeout,
+    config.guardrails_timeout_percentile,
+    config.guardrails_timeout_multiplier
+)
+
+
+def guardrails_fallback(site: str, text: str, error: str) -> dict:
+    """
+    Scan result when guardrails could not be reached, per call-site policy
+    (GUARDRAILS_INPUT_POLICY / GUARDRAILS_OUTPUT_POLICY): "open" passes
+    the text through, "closed" blocks the query or withholds the answer.
+    """
+    policy = config.guardrails_input_policy if site == "input" else config.guardrails_output_policy
+    if policy == "closed":
+        return {
+            "is_valid": False,
+            "sanitized": text if site == "input" else "[Response withheld: security scan unavailable]",
+            "risk_score": 1.0,
+            "error": error,
+            "blocked_reason": "Security scan unavailable (fail-closed)"
+        }
+    return {"is_valid": True, "sanitized": text, "risk_score": 0, "error": error}
+
+
+def add_blocked_reason(result: dict) -> dict:
+    if not result.get("is_valid", True):
+        blocked_scanners = [s["name"] for s in result.get("scanners", []) if not s.get("is_valid", True)]
+        result["blocked_reason"] = f"Blocked by: {', '.join(blocked_scanners)}"
+    return result
+
+
 class GuardrailsClient:
     """Client for Guardrails API (LLM Guard)"""
     
-    def __init__(self, base_url: str, enabled: bool = True):
+    def __init__(self, base_url: str, enabled: bool = True, session: requests.Session = None,
+                 breaker: CircuitBreaker = None):
         self.base_url = base_url.rstrip("/")
         self.enabled = enabled
-        self._available = None
+        self.session = session or requests.Session()
+        self.breaker = breaker or guardrails_breaker
+        self._health = (0.0, False)  # (checked_at, healthy)
     
     def is_available(self) -> bool:
-        """Check if Guardrails API is available"""
+        """Guardrails reachable: circuit not open and /health OK (cached GUARDRAILS_HEALTH_TTL)"""
         if not self.enabled:
             return False
+        if self.breaker.state == "open":
+            return False
         
-        if self._available is None:
+        checked_at, healthy = self._health
+        if time.time() - checked_at >= config.guardrails_health_ttl:
             try:
-                response = requests.get(f"{self.base_url}/health", timeout=5)
-                self._available = response.status_code == 200
-            except:
-                self._available = False
+                response = self.session.get(f"{self.base_url}/health", timeout=5)
+                healthy = response.status_code == 200
+            except requests.exceptions.RequestException:
+                healthy = False
+            self._health = (time.time(), healthy)
         
-        return self._available
+        return healthy
+    
+    def _post(self, path: str, payload: dict) -> dict:
+        """POST through the circuit breaker with the adaptive timeout"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"guardrails circuit open, {path} not attempted")
+        
+        start = time.time()
+        healthy = None  # stays None if the call ends without a verdict (interrupted)
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                timeout=(config.http_connect_timeout, self.breaker.timeout())
+            )
+            response.raise_for_status()
+            result = response.json()
+            healthy = True
+            return result
+        except requests.exceptions.HTTPError as e:
+            # A 4xx is this request's own fault, not a sign the upstream is struggling
+            healthy = e.response is not None and e.response.status_code < 500
+            raise
+        except requests.exceptions.RequestException:
+            healthy = False
+            raise
+        finally:
+            self.breaker.record(healthy, time.time() - start)
     
     def scan_input(self, prompt: str) -> dict:
         """
@@ -101,25 +828,11 @@ class GuardrailsClient:
             return {"is_valid": True, "sanitized": prompt, "risk_score": 0, "guardrails": "disabled"}
         
         try:
-            response = requests.post(
-                f"{self.base_url}/scan/input",
-                json={"prompt": prompt},
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            # Add blocked reason if invalid
-            if not result.get("is_valid", True):
-                blocked_scanners = [s["name"] for s in result.get("scanners", []) if not s.get("is_valid", True)]
-                result["blocked_reason"] = f"Blocked by: {', '.join(blocked_scanners)}"
-            
-            return result
-            
-        except requests.exceptions.RequestException as e:
+            return add_blocked_reason(self._post("/scan/input", {"prompt": prompt}))
+        
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             logger.warning(f"Guardrails input scan failed: {e}")
-            # Fail open if guardrails unavailable (configurable)
-            return {"is_valid": True, "sanitized": prompt, "risk_score": 0, "error": str(e)}
+            return guardrails_fallback("input", prompt, str(e))
     
     def scan_output(self, prompt: str, output: str) -> dict:
         """
@@ -132,17 +845,11 @@ class GuardrailsClient:
             return {"is_valid": True, "sanitized": output, "risk_score": 0, "guardrails": "disabled"}
         
         try:
-            response = requests.post(
-                f"{self.base_url}/scan/output",
-                json={"prompt": prompt, "output": output},
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
+            return self._post("/scan/output", {"prompt": prompt, "output": output})
+        
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
             logger.warning(f"Guardrails output scan failed: {e}")
-            return {"is_valid": True, "sanitized": output, "risk_score": 0, "error": str(e)}
+            return guardrails_fallback("output", output, str(e))
 
 
 # =============================================================================
@@ -152,23 +859,67 @@ class GuardrailsClient:
 class OllamaClient:
     """Client for Ollama API"""
     
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, session: requests.Session = None):
         self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self._batch_endpoint = True  # /api/embed (multi-input), disabled on 404
     
     def embed(self, text: str, model: str = None) -> List[float]:
         """Generate embedding for text"""
         model = model or config.embedding_model
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/embeddings",
             json={"model": model, "prompt": text},
-            timeout=60
+            timeout=(config.http_connect_timeout, config.ollama_timeout)
         )
         response.raise_for_status()
         return response.json()["embedding"]
     
-    def embed_batch(self, texts: List[str], model: str = None) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        return [self.embed(text, model) for text in texts]
+    def embed_batch(self, texts: List[str], model: str = None, timings: list = None) -> List[List[float]]:
+        """
+        Generate embeddings for multiple texts (order preserved).
+        
+        Texts are sent EMBED_BATCH_SIZE at a time to the multi-input /api/embed
+        endpoint. Older Ollama servers without it fall back to EMBED_CONCURRENCY
+        parallel /api/embeddings calls. Per-batch timings are appended to
+        `timings` when a list is given.
+        """
+        model = model or config.embedding_model
+        batch_size = max(1, config.embed_batch_size)
+        embeddings = []
+        
+        for offset in range(0, len(texts), batch_size):
+            batch = texts[offset:offset + batch_size]
+            start = time.time()
+            vectors, mode = self._embed_batch_request(batch, model)
+            latency = (time.time() - start) * 1000
+            
+            embeddings.extend(vectors)
+            logger.debug(f"Embedded batch of {len(batch)} ({mode}) in {latency:.0f}ms")
+            if timings is not None:
+                timings.append({"size": len(batch), "mode": mode, "latency_ms": latency})
+        
+        return embeddings
+    
+    def _embed_batch_request(self, batch: List[str], model: str):
+        """Embed one batch, returns (vectors, mode)"""
+        if self._batch_endpoint:
+            response = self.session.post(
+                f"{self.base_url}/api/embed",
+                json={"model": model, "input": batch},
+                timeout=(config.http_connect_timeout, config.ollama_timeout)
+            )
+            # Unknown route (old Ollama) vs. unknown model: only the former falls back
+            if response.status_code == 404 and "model" not in response.text:
+                logger.info("Ollama /api/embed not available, falling back to /api/embeddings")
+                self._batch_endpoint = False
+            else:
+                response.raise_for_status()
+                return response.json()["embeddings"], "batch"
+        
+        workers = max(1, min(config.embed_concurrency, len(batch)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda text: self.embed(text, model), batch)), "fanout"
     
     def chat(self, prompt: str, system: str = None, model: str = None) -> str:
         """Generate chat response"""
@@ -178,10 +929,10 @@ class OllamaClient:
             messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/chat",
             json={"model": model, "messages": messages, "stream": False},
-            timeout=300
+            timeout=(config.http_connect_timeout, config.ollama_chat_timeout)
         )
         response.raise_for_status()
         return response.json()["message"]["content"]
@@ -191,22 +942,23 @@ class OllamaClient:
 # Qdrant Client
 # =============================================================================
 
-class QdrantClient:
+class QdrantClient(QdrantPointsMixin):
     """Simple Qdrant REST API client"""
     
-    def __init__(self, url: str, api_key: str = None):
+    def __init__(self, url: str, api_key: str = None, session: requests.Session = None):
         self.url = url.rstrip("/")
+        self.session = session or requests.Session()
         self.headers = {"Content-Type": "application/json"}
         if api_key:
             self.headers["api-key"] = api_key
     
     def _request(self, method: str, path: str, data: dict = None) -> dict:
-        response = requests.request(
+        response = self.session.request(
             method,
             f"{self.url}{path}",
             headers=self.headers,
             json=data,
-            timeout=30
+            timeout=(config.http_connect_timeout, config.qdrant_timeout)
         )
         response.raise_for_status()
         return response.json()
@@ -247,36 +999,450 @@ class QdrantClient:
 
 
 # =============================================================================
-# Text Processing
+# Async Clients (FastAPI request path)
 # =============================================================================
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    text_len = len(text)
+class AsyncGuardrailsClient:
+    """Async client for Guardrails API (LLM Guard)"""
+    
+    def __init__(self, base_url: str, http: AsyncHTTPPool, enabled: bool = True, breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip("/")
+        self.http = http
+        self.enabled = enabled
+        self.breaker = breaker or guardrails_breaker
+        self._health = (0.0, False)  # (checked_at, healthy)
+    
+    async def is_available(self) -> bool:
+        """See GuardrailsClient.is_available"""
+        if not self.enabled:
+            return False
+        if self.breaker.state == "open":
+            return False
+        
+        checked_at, healthy = self._health
+        if time.time() - checked_at >= config.guardrails_health_ttl:
+            try:
+                response = await self.http.request("guardrails", "GET", f"{self.base_url}/health", timeout=5)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            self._health = (time.time(), healthy)
+        
+        return healthy
+    
+    async def _post(self, path: str, payload: dict) -> dict:
+        """See GuardrailsClient._post"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"guardrails circuit open, {path} not attempted")
+        
+        start = time.time()
+        healthy = None  # stays None if cancelled mid-call
+        try:
+            response = await self.http.request(
+                "guardrails", "POST", f"{self.base_url}{path}",
+                json=payload,
+                timeout=self.breaker.timeout()
+            )
+            response.raise_for_status()
+            try:
+                result = response.json()
+            except ValueError as e:
+                raise httpx.DecodingError(f"{path}: invalid JSON response: {e}", request=response.request)
+            healthy = True
+            return result
+        except httpx.HTTPStatusError as e:
+            healthy = e.response.status_code < 500
+            raise
+        except httpx.HTTPError:
+            healthy = False
+            raise
+        finally:
+            self.breaker.record(healthy, time.time() - start)
+    
+    async def scan_input(self, prompt: str) -> dict:
+        """Scan input prompt for security issues (see GuardrailsClient.scan_input)"""
+        if not self.enabled:
+            return {"is_valid": True, "sanitized": prompt, "risk_score": 0, "guardrails": "disabled"}
+        
+        try:
+            return add_blocked_reason(await self._post("/scan/input", {"prompt": prompt}))
+        
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            logger.warning(f"Guardrails input scan failed: {e}")
+            return guardrails_fallback("input", prompt, str(e))
+    
+    async def scan_output(self, prompt: str, output: str) -> dict:
+        """Scan LLM output for security issues (see GuardrailsClient.scan_output)"""
+        if not self.enabled:
+            return {"is_valid": True, "sanitized": output, "risk_score": 0, "guardrails": "disabled"}
+        
+        try:
+            return await self._post("/scan/output", {"prompt": prompt, "output": output})
+        
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            logger.warning(f"Guardrails output scan failed: {e}")
+            return guardrails_fallback("output", output, str(e))
+
+
+class AsyncOllamaClient:
+    """Async client for Ollama API"""
+    
+    def __init__(self, base_url: str, http: AsyncHTTPPool):
+        self.base_url = base_url.rstrip("/")
+        self.http = http
+        self._batch_endpoint = True
+    
+    async def embed(self, text: str, model: str = None) -> List[float]:
+        """Generate embedding for text"""
+        model = model or config.embedding_model
+        response = await self.http.request(
+            "ollama", "POST", f"{self.base_url}/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=config.ollama_timeout
+        )
+        response.raise_for_status()
+        return response.json()["embedding"]
+    
+    async def embed_batch(self, texts: List[str], model: str = None, timings: list = None) -> List[List[float]]:
+        """Generate embeddings for multiple texts (see OllamaClient.embed_batch)"""
+        model = model or config.embedding_model
+        batch_size = max(1, config.embed_batch_size)
+        embeddings = []
+        
+        for offset in range(0, len(texts), batch_size):
+            batch = texts[offset:offset + batch_size]
+            start = time.time()
+            vectors, mode = await self._embed_batch_request(batch, model)
+            latency = (time.time() - start) * 1000
+            
+            embeddings.extend(vectors)
+            logger.debug(f"Embedded batch of {len(batch)} ({mode}) in {latency:.0f}ms")
+            if timings is not None:
+                timings.append({"size": len(batch), "mode": mode, "latency_ms": latency})
+        
+        return embeddings
+    
+    async def _embed_batch_request(self, batch: List[str], model: str):
+        """Embed one batch, returns (vectors, mode)"""
+        if self._batch_endpoint:
+            response = await self.http.request(
+                "ollama", "POST", f"{self.base_url}/api/embed",
+                json={"model": model, "input": batch},
+                timeout=config.ollama_timeout
+            )
+            if response.status_code == 404 and "model" not in response.text:
+                logger.info("Ollama /api/embed not available, falling back to /api/embeddings")
+                self._batch_endpoint = False
+            else:
+                response.raise_for_status()
+                return response.json()["embeddings"], "batch"
+        
+        semaphore = asyncio.Semaphore(max(1, config.embed_concurrency))
+        
+        async def embed_one(text: str) -> List[float]:
+            async with semaphore:
+                return await self.embed(text, model)
+        
+        return list(await asyncio.gather(*(embed_one(text) for text in batch))), "fanout"
+    
+    async def chat(self, prompt: str, system: str = None, model: str = None) -> str:
+        """Generate chat response"""
+        model = model or config.llm_model
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        
+        response = await self.http.request(
+            "ollama_chat", "POST", f"{self.base_url}/api/chat",
+            json={"model": model, "messages": messages, "stream": False},
+            timeout=config.ollama_chat_timeout
+        )
+        response.raise_for_status()
+        return response.json()["message"]["content"]
     
-    while start < text_len:
-        end = start + chunk_size
-        chunk = text[start:end]
+    async def chat_stream(self, prompt: str, system: str = None, model: str = None) -> AsyncIterator[str]:
+        """Generate chat response, yielding tokens as Ollama produces them"""
+        model = model or config.llm_model
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
         
-        if end < text_len:
-            last_period = chunk.rfind(". ")
-            last_newline = chunk.rfind("\n")
-            break_point = max(last_period, last_newline)
-            if break_point > chunk_size // 2:
-                chunk = text[start:start + break_point + 1]
-                end = start + break_point + 1
+        async with self.http.stream(
+            "ollama_chat", "POST", f"{self.base_url}/api/chat",
+            json={"model": model, "messages": messages, "stream": True},
+            timeout=config.ollama_chat_timeout
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                content = data.get("message", {}).get("content", "")
+                if content:
+                    yield content
+                if data.get("done"):
+                    break
+
+
+class AsyncQdrantClient:
+    """Async Qdrant REST API client"""
+    
+    def __init__(self, url: str, http: AsyncHTTPPool, api_key: str = None):
+        self.url = url.rstrip("/")
+        self.http = http
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["api-key"] = api_key
+    
+    async def _request(self, method: str, path: str, data: dict = None) -> dict:
+        response = await self.http.request(
+            "qdrant", method, f"{self.url}{path}",
+            headers=self.headers,
+            json=data,
+            timeout=config.qdrant_timeout
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def collection_exists(self, name: str) -> bool:
+        try:
+            await self._request("GET", f"/collections/{name}")
+            return True
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return False
+            raise
+    
+    async def create_collection(self, name: str, vector_size: int):
+        await self._request("PUT", f"/collections/{name}", {
+            "vectors": {"size": vector_size, "distance": "Cosine"}
+        })
+    
+    async def delete_collection(self, name: str):
+        await self._request("DELETE", f"/collections/{name}")
+    
+    async def upsert_points(self, name: str, points: List[dict]):
+        await self._request("PUT", f"/collections/{name}/points", {"points": points})
+    
+    async def create_payload_index(self, name: str, field: str):
+        await self._request("PUT", f"/collections/{name}/index", {"field_name": field, "field_schema": "keyword"})
+    
+    async def delete_points(self, name: str, ids: List[str]):
+        for batch in batched(ids, 1000):
+            await self._request("POST", f"/collections/{name}/points/delete", {"points": batch})
+    
+    async def source_points(self, name: str, source: str) -> Dict[str, int]:
+        """Stored points of one source: {point_id: chunk_index} (see QdrantPointsMixin)"""
+        points = {}
+        offset = None
+        while True:
+            result = await self._request("POST", f"/collections/{name}/points/scroll", source_scroll_query(source, offset))
+            offset = collect_source_points(result.get("result", {}), points)
+            if offset is None:
+                return points
+    
+    async def set_payloads(self, name: str, payloads: Dict[str, dict]):
+        await self._request("POST", f"/collections/{name}/points/batch", {
+            "operations": [
+                {"set_payload": {"payload": payload, "points": [point_id]}}
+                for point_id, payload in payloads.items()
+            ]
+        })
+    
+    async def search(self, name: str, vector: List[float], limit: int = 5) -> List[dict]:
+        result = await self._request("POST", f"/collections/{name}/points/search", {
+            "vector": vector, "limit": limit, "with_payload": True
+        })
+        return result.get("result", [])
+    
+    async def count(self, name: str) -> int:
+        result = await self._request("POST", f"/collections/{name}/points/count", {"exact": True})
+        return result.get("result", {}).get("count", 0)
+    
+    async def get_collections(self) -> List[str]:
+        result = await self._request("GET", "/collections")
+        return [c["name"] for c in result.get("result", {}).get("collections", [])]
+
+
+# =============================================================================
+# Text Processing
+# =============================================================================
+
+SENTENCE_END = re.compile(r"[.!?:;\n]\s")
+
+# A period after these (or after a single letter, i.e. an initial) is not a
+# sentence end: "Dr. Jane Smith" must reach the output scan in one piece
+ABBREVIATIONS = frozenset({
+    "dr", "mr", "mrs", "ms", "prof", "sr", "jr", "st", "mt", "no", "vs",
+    "etc", "e.g", "i.e", "inc", "ltd", "co", "corp", "dept", "fig", "approx",
+})
+
+
+def _is_abbreviation(buffer: str, dot: int) -> bool:
+    """Whether the period at buffer[dot] closes an abbreviation or an initial"""
+    start = max(buffer.rfind(" ", 0, dot), buffer.rfind("\n", 0, dot)) + 1
+    word = buffer[start:dot].lstrip("(\"'").lower()
+    return (len(word) == 1 and word.isalpha()) or word in ABBREVIATIONS
+
+
+def split_stream_segment(buffer: str, min_chars: int, max_chars: int):
+    """
+    Split a streamed answer buffer into (segment ready to scan, holdback).
+    
+    Releases text up to the last sentence boundary once at least min_chars
+    are complete. Periods after common abbreviations and initials are not
+    boundaries, so names like "Dr. J. Smith" stay in one output scan. If no
+    boundary shows up within max_chars, cut at the last whitespace; only
+    this fallback can split an entity across two scans.
+    """
+    last_end = -1
+    for match in SENTENCE_END.finditer(buffer):
+        if buffer[match.start()] == "." and _is_abbreviation(buffer, match.start()):
+            continue
+        last_end = match.end()
+    
+    if last_end >= min_chars:
+        return buffer[:last_end], buffer[last_end:]
+    
+    if len(buffer) >= max_chars:
+        cut = max(buffer.rfind(" ", 0, max_chars), buffer.rfind("\n", 0, max_chars)) + 1
+        cut = cut or max_chars
+        return buffer[:cut], buffer[cut:]
+    
+    return "", buffer
+
+
+# =============================================================================
+# RAG Prompt & Response Helpers (shared by sync and async pipelines)
+# =============================================================================
+
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions based on the provided context.
+Use ONLY the information from the context to answer. If the context doesn't contain enough information, say so.
+Always cite the source when providing information."""
+
+
+def build_context(results: List[dict]):
+    """Build (context, sources) from Qdrant search results"""
+    context_parts = []
+    sources = []
+    for i, result in enumerate(results):
+        payload = result.get("payload", {})
+        text = payload.get("text", "")
+        source = payload.get("source", "unknown")
+        score = result.get("score", 0)
         
-        chunks.append(chunk.strip())
-        start = end - overlap
+        context_parts.append(f"[Source {i+1}: {source}]\n{text}")
+        sources.append({"source": source, "score": score, "chunk_index": payload.get("chunk_index", 0)})
     
-    return [c for c in chunks if c]
+    return "\n\n".join(context_parts), sources
+
+
+def build_user_prompt(context: str, question: str) -> str:
+    return f"""Context:
+{context}
 
+Question: {question}
+
+Answer based on the context above:"""
+
+
+def blocked_response(input_scan: dict) -> dict:
+    return {
+        "answer": None,
+        "blocked": True,
+        "blocked_reason": input_scan.get("blocked_reason", "Query blocked by security guardrails"),
+        "guardrails": {
+            "input_scan": input_scan,
+            "output_scan": None
+        },
+        "sources": [],
+        "context": ""
+    }
+
+
+def no_context_response(input_scan: dict) -> dict:
+    return {
+        "answer": "I couldn't find any relevant information.",
+        "blocked": False,
+        "sources": [],
+        "context": "",
+        "guardrails": {
+            "input_scan": input_scan,
+            "output_scan": None
+        }
+    }
 
-def generate_id(text: str, source: str) -> str:
-    content = f"{source}:{text[:100]}"
-    return hashlib.md5(content.encode()).hexdigest()
+
+def scan_summary(input_scan: dict) -> dict:
+    return {
+        "is_valid": input_scan.get("is_valid"),
+        "risk_score": input_scan.get("risk_score"),
+        "latency_ms": input_scan.get("latency_ms")
+    }
+
+
+def answer_response(raw_answer: str, input_scan: dict, output_scan: dict, sources: List[dict], context: str) -> dict:
+    # Use sanitized output (PII redacted) if available
+    final_answer = output_scan.get("sanitized", raw_answer)
+    
+    # Check if output was blocked (not just redacted)
+    output_blocked = not output_scan.get("is_valid", True) and output_scan.get("risk_score", 0) > 0.9
+    
+    return {
+        "answer": final_answer,
+        "blocked": output_blocked,
+        "sources": sources,
+        "context": context,
+        "guardrails": {
+            "input_scan": scan_summary(input_scan),
+            "output_scan": {
+                "is_valid": output_scan.get("is_valid"),
+                "risk_score": output_scan.get("risk_score"),
+                "latency_ms": output_scan.get("latency_ms"),
+                "pii_redacted": output_scan.get("sanitized") != raw_answer
+            }
+        }
+    }
+
+
+def stats_response(count: int, collections: List[str], guardrails_available: bool, http_stats: dict,
+                   cache_stats: dict) -> dict:
+    return {
+        "collection": config.collection_name,
+        "document_count": count,
+        "all_collections": collections,
+        "guardrails": {
+            "enabled": config.guardrails_enabled,
+            "available": guardrails_available,
+            "url": config.guardrails_url,
+            "policy": {"input": config.guardrails_input_policy, "output": config.guardrails_output_policy},
+            "circuit": guardrails_breaker.stats()
+        },
+        "http_pool": http_stats,
+        "cache": cache_stats,
+        "config": {
+            "qdrant_url": config.qdrant_url,
+            "ollama_url": config.ollama_url,
+            "embedding_model": config.embedding_model,
+            "llm_model": config.llm_model
+        }
+    }
+
+
+def ingest_response(source: str, chunks: int, points: List[dict], deleted: int, timings: List[dict]) -> dict:
+    return {
+        "source": source,
+        "chunks": chunks,
+        "embedded": len(points),
+        "deleted": deleted,
+        "status": "ingested",
+        "embedding": {
+            "batches": len(timings),
+            "latency_ms": sum(t["latency_ms"] for t in timings)
+        }
+    }
 
 
 # =============================================================================
@@ -284,43 +1450,90 @@ def generate_id(text: str, source: str) -> str:
 # =============================================================================
 
 class RAGPipeline:
-    """RAG Pipeline using Qdrant + Ollama + Guardrails"""
+    """RAG Pipeline using Qdrant + Ollama + Guardrails (sync, used by the CLI)"""
     
     def __init__(self):
-        self.ollama = OllamaClient(config.ollama_url)
-        self.qdrant = QdrantClient(config.qdrant_url, config.qdrant_api_key)
-        self.guardrails = GuardrailsClient(config.guardrails_url, config.guardrails_enabled)
+        self.http = HTTPPool(config.http_pool_size, config.http_max_retries, config.http_backoff_factor)
+        self.ollama = OllamaClient(config.ollama_url, self.http.session("ollama"))
+        self.qdrant = QdrantClient(config.qdrant_url, config.qdrant_api_key, self.http.session("qdrant"))
+        self.guardrails = GuardrailsClient(
+            config.guardrails_url, config.guardrails_enabled, self.http.session("guardrails")
+        )
+        self.embedding_cache = EmbeddingCache(
+            config.embedding_cache_size, config.embedding_cache_ttl, config.embedding_cache_redis_url
+        )
+        self.answer_cache = SemanticAnswerCache(
+            config.semantic_cache_size, config.semantic_cache_threshold, config.semantic_cache_ttl,
+            config.semantic_cache_refresh_seconds, config.semantic_cache_redis_url
+        )
+        self._executor = ThreadPoolExecutor(max_workers=config.http_pool_size)
         self._ensure_collection()
     
     def _ensure_collection(self):
         if not self.qdrant.collection_exists(config.collection_name):
             self.qdrant.create_collection(config.collection_name, config.vector_size)
+        # Re-ingestion looks up a source's points by this field
+        self.qdrant.create_payload_index(config.collection_name, "source")
     
     def ingest_text(self, text: str, source: str, metadata: dict = None) -> dict:
-        """Ingest text into the vector database"""
-        chunks = chunk_text(text, config.chunk_size, config.chunk_overlap)
-        embeddings = self.ollama.embed_batch(chunks)
-        
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            point_id = generate_id(chunk, source)
-            payload = {
-                "text": chunk,
-                "source": source,
-                "chunk_index": i,
-                **(metadata or {})
-            }
-            points.append({"id": point_id, "vector": embedding, "payload": payload})
+        """
+        Ingest text into the vector database as the new content of `source`:
+        only chunks not stored yet are embedded, moved ones get their
+        chunk_index updated, and points of chunks no longer in the text are
+        deleted once the new ones are stored.
+        """
+        chunks = chunk_text(text, config.chunk_size, config.chunk_overlap, get_tokenizer(config.chunk_tokenizer))
+        known = self.qdrant.source_points(config.collection_name, source)
+        seen = {}
+        new, moved = plan_chunks(enumerate(chunks), source, known, seen)
+        timings = []
+        embeddings = self.ollama.embed_batch([chunk for _, chunk, _ in new], timings=timings)
         
-        self.qdrant.upsert_points(config.collection_name, points)
+        points = build_points(new, embeddings, source, metadata)
+        if points:
+            self.qdrant.upsert_points(config.collection_name, points)
+        if moved:
+            self.qdrant.set_payloads(
+                config.collection_name, {point_id: {"chunk_index": index} for point_id, index in moved.items()}
+            )
+        stale = stale_points(known, seen)
+        if stale:
+            self.qdrant.delete_points(config.collection_name, stale)
+        self.answer_cache.invalidate()
         
-        return {"source": source, "chunks": len(points), "status": "ingested"}
+        return ingest_response(source, len(seen), points, len(stale), timings)
+    
+    def ingest_files(self, paths: List[str], workers: int = 1) -> dict:
+        """
+        Ingest files, directories and glob patterns, returns a throughput summary.
+        
+        Files are streamed through the IngestPipeline shared with the RAG
+        pipeline CLI (see ingestion.py): only new or changed chunks are
+        embedded, and a file that fails is rolled back to its previous points.
+        """
+        inputs = expand_inputs(paths)
+        print(f"🚀 Ingesting {len(inputs)} files with {max(1, workers)} workers")
+        summary = IngestPipeline(config, self.ollama.embed_batch, self.qdrant, workers).run(inputs)
+        self.answer_cache.invalidate()
+        return summary
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding, served from the embedding cache when possible"""
+        embedding = self.embedding_cache.get(config.embedding_model, query)
+        if embedding is None:
+            embedding = self.ollama.embed(query)
+            self.embedding_cache.put(config.embedding_model, query, embedding)
+        return embedding
+    
+    def _retrieve(self, query: str, top_k: int = None):
+        """Returns (query embedding, search results)"""
+        top_k = top_k or config.top_k
+        query_embedding = self.embed_query(query)
+        return query_embedding, self.qdrant.search(config.collection_name, query_embedding, limit=top_k)
     
     def search(self, query: str, top_k: int = None) -> List[dict]:
         """Search for relevant chunks"""
-        top_k = top_k or config.top_k
-        query_embedding = self.ollama.embed(query)
-        return self.qdrant.search(config.collection_name, query_embedding, limit=top_k)
+        return self._retrieve(query, top_k)[1]
     
     def query(self, question: str, top_k: int = None) -> dict:
         """
@@ -331,7 +1544,17 @@ class RAGPipeline:
         4. Generate answer with Ollama
         5. Scan output for PII leakage
         6. Return sanitized response
+        
+        With SPECULATIVE_RETRIEVAL, steps 1 and 3 run in parallel: only the
+        LLM call waits for the scan verdict, and retrieval results are
+        discarded when the query is blocked. Near-duplicate questions are
+        answered from the semantic answer cache (input scan still applies).
         """
+        top_k = top_k or config.top_k
+        cache_version = self._answer_cache_version()
+        retrieval = None
+        if config.speculative_retrieval:
+            retrieval = self._executor.submit(self._retrieve, question, top_k)
         
         # =====================================================================
         # STEP 1: INPUT GUARDRAILS
@@ -340,95 +1563,47 @@ class RAGPipeline:
         
         if not input_scan.get("is_valid", True):
             logger.warning(f"Query blocked by guardrails: {input_scan.get('blocked_reason', 'unknown')}")
-            return {
-                "answer": None,
-                "blocked": True,
-                "blocked_reason": input_scan.get("blocked_reason", "Query blocked by security guardrails"),
-                "guardrails": {
-                    "input_scan": input_scan,
-                    "output_scan": None
-                },
-                "sources": [],
-                "context": ""
-            }
+            if retrieval is not None:
+                retrieval.cancel()
+            return blocked_response(input_scan)
         
         # =====================================================================
         # STEP 2: RAG SEARCH (Qdrant)
         # =====================================================================
-        results = self.search(question, top_k)
+        embedding, results = retrieval.result() if retrieval is not None else self._retrieve(question, top_k)
         
         if not results:
-            return {
-                "answer": "I couldn't find any relevant information.",
-                "blocked": False,
-                "sources": [],
-                "context": "",
-                "guardrails": {
-                    "input_scan": input_scan,
-                    "output_scan": None
-                }
-            }
+            return no_context_response(input_scan)
         
-        # Build context from search results
-        context_parts = []
-        sources = []
-        for i, result in enumerate(results):
-            payload = result.get("payload", {})
-            text = payload.get("text", "")
-            source = payload.get("source", "unknown")
-            score = result.get("score", 0)
-            
-            context_parts.append(f"[Source {i+1}: {source}]\n{text}")
-            sources.append({"source": source, "score": score, "chunk_index": payload.get("chunk_index", 0)})
+        cached = self.answer_cache.lookup(embedding, top_k, input_scan)
+        if cached is not None:
+            return cached
         
-        context = "\n\n".join(context_parts)
+        context, sources = build_context(results)
         
         # =====================================================================
         # STEP 3: LLM GENERATION (Ollama)
         # =====================================================================
-        system_prompt = """You are a helpful assistant that answers questions based on the provided context.
-Use ONLY the information from the context to answer. If the context doesn't contain enough information, say so.
-Always cite the source when providing information."""
-
-        user_prompt = f"""Context:
-{context}
-
-Question: {question}
-
-Answer based on the context above:"""
-
-        raw_answer = self.ollama.chat(user_prompt, system=system_prompt)
+        raw_answer = self.ollama.chat(build_user_prompt(context, question), system=SYSTEM_PROMPT)
         
         # =====================================================================
         # STEP 4: OUTPUT GUARDRAILS (PII Redaction)
         # =====================================================================
         output_scan = self.guardrails.scan_output(question, raw_answer)
         
-        # Use sanitized output (PII redacted) if available
-        final_answer = output_scan.get("sanitized", raw_answer)
-        
-        # Check if output was blocked (not just redacted)
-        output_blocked = not output_scan.get("is_valid", True) and output_scan.get("risk_score", 0) > 0.9
-        
-        return {
-            "answer": final_answer,
-            "blocked": output_blocked,
-            "sources": sources,
-            "context": context,
-            "guardrails": {
-                "input_scan": {
-                    "is_valid": input_scan.get("is_valid"),
-                    "risk_score": input_scan.get("risk_score"),
-                    "latency_ms": input_scan.get("latency_ms")
-                },
-                "output_scan": {
-                    "is_valid": output_scan.get("is_valid"),
-                    "risk_score": output_scan.get("risk_score"),
-                    "latency_ms": output_scan.get("latency_ms"),
-                    "pii_redacted": output_scan.get("sanitized") != raw_answer
-                }
-            }
-        }
+        response = answer_response(raw_answer, input_scan, output_scan, sources, context)
+        if not response["blocked"]:
+            self.answer_cache.store(embedding, top_k, response, cache_version)
+        return response
+    
+    def _answer_cache_version(self) -> int:
+        """Answer cache version after picking up collection changes made elsewhere"""
+        if self.answer_cache.needs_refresh():
+            try:
+                self.answer_cache.refresh(self.qdrant.count(config.collection_name))
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Answer cache refresh failed: {e}")
+        return self.answer_cache.version
     
     def stats(self) -> dict:
         """Get collection statistics"""
@@ -436,29 +1611,273 @@ Answer based on the context above:"""
         collections = self.qdrant.get_collections()
         guardrails_available = self.guardrails.is_available()
         
-        return {
-            "collection": config.collection_name,
-            "document_count": count,
-            "all_collections": collections,
-            "guardrails": {
-                "enabled": config.guardrails_enabled,
-                "available": guardrails_available,
-                "url": config.guardrails_url
-            },
-            "config": {
-                "qdrant_url": config.qdrant_url,
-                "ollama_url": config.ollama_url,
-                "embedding_model": config.embedding_model,
-                "llm_model": config.llm_model
-            }
-        }
+        return stats_response(
+            count, collections, guardrails_available, self.http.stats(),
+            {"embeddings": self.embedding_cache.stats(), "answers": self.answer_cache.stats()}
+        )
     
     def clear(self):
         """Clear the collection"""
         if self.qdrant.collection_exists(config.collection_name):
             self.qdrant.delete_collection(config.collection_name)
         self._ensure_collection()
+        self.answer_cache.invalidate()
+        return {"status": "cleared", "collection": config.collection_name}
+
+
+class AsyncRAGPipeline:
+    """
+    Async RAG Pipeline used by the FastAPI handlers.
+    
+    Same flow as RAGPipeline, but every upstream call is awaited through
+    AsyncHTTPPool so a pod can hold many slow /query calls concurrently
+    without exhausting the threadpool.
+    """
+    
+    def __init__(self):
+        self.http = AsyncHTTPPool(config.http_pool_size, config.http_max_retries, limits={
+            "ollama": config.ollama_max_concurrency,
+            "ollama_chat": config.ollama_chat_max_concurrency,
+            "qdrant": config.qdrant_max_concurrency,
+            "guardrails": config.guardrails_max_concurrency
+        })
+        self.ollama = AsyncOllamaClient(config.ollama_url, self.http)
+        self.qdrant = AsyncQdrantClient(config.qdrant_url, self.http, config.qdrant_api_key)
+        self.guardrails = AsyncGuardrailsClient(config.guardrails_url, self.http, config.guardrails_enabled)
+        self.embedding_cache = EmbeddingCache(
+            config.embedding_cache_size, config.embedding_cache_ttl, config.embedding_cache_redis_url
+        )
+        self.answer_cache = SemanticAnswerCache(
+            config.semantic_cache_size, config.semantic_cache_threshold, config.semantic_cache_ttl,
+            config.semantic_cache_refresh_seconds, config.semantic_cache_redis_url
+        )
+    
+    async def ensure_collection(self):
+        if not await self.qdrant.collection_exists(config.collection_name):
+            await self.qdrant.create_collection(config.collection_name, config.vector_size)
+        # Re-ingestion looks up a source's points by this field
+        await self.qdrant.create_payload_index(config.collection_name, "source")
+    
+    async def ingest_text(self, text: str, source: str, metadata: dict = None) -> dict:
+        """Ingest text into the vector database as the new content of `source` (see RAGPipeline.ingest_text)"""
+        chunks = await asyncio.to_thread(
+            chunk_text, text, config.chunk_size, config.chunk_overlap, get_tokenizer(config.chunk_tokenizer)
+        )
+        known = await self.qdrant.source_points(config.collection_name, source)
+        seen = {}
+        new, moved = plan_chunks(enumerate(chunks), source, known, seen)
+        timings = []
+        embeddings = await self.ollama.embed_batch([chunk for _, chunk, _ in new], timings=timings)
+        
+        points = build_points(new, embeddings, source, metadata)
+        if points:
+            await self.qdrant.upsert_points(config.collection_name, points)
+        if moved:
+            await self.qdrant.set_payloads(
+                config.collection_name, {point_id: {"chunk_index": index} for point_id, index in moved.items()}
+            )
+        stale = stale_points(known, seen)
+        if stale:
+            await self.qdrant.delete_points(config.collection_name, stale)
+        self.answer_cache.invalidate()
+        
+        return ingest_response(source, len(seen), points, len(stale), timings)
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Query embedding, served from the embedding cache when possible"""
+        cache = self.embedding_cache
+        # Only the shared (Redis) lookup blocks; keep it off the event loop
+        if cache.shared is not None:
+            embedding = await asyncio.to_thread(cache.get, config.embedding_model, query)
+        else:
+            embedding = cache.get(config.embedding_model, query)
+        
+        if embedding is None:
+            embedding = await self.ollama.embed(query)
+            if cache.shared is not None:
+                await asyncio.to_thread(cache.put, config.embedding_model, query, embedding)
+            else:
+                cache.put(config.embedding_model, query, embedding)
+        return embedding
+    
+    async def _retrieve(self, query: str, top_k: int = None):
+        """Returns (query embedding, search results)"""
+        top_k = top_k or config.top_k
+        query_embedding = await self.embed_query(query)
+        return query_embedding, await self.qdrant.search(config.collection_name, query_embedding, limit=top_k)
+    
+    async def search(self, query: str, top_k: int = None) -> List[dict]:
+        """Search for relevant chunks"""
+        return (await self._retrieve(query, top_k))[1]
+    
+    async def _guarded_retrieval(self, question: str, top_k: int = None):
+        """Input scan + retrieval (speculative if enabled), returns (input_scan, embedding, results)"""
+        retrieval = None
+        if config.speculative_retrieval:
+            retrieval = asyncio.create_task(self._retrieve(question, top_k))
+        
+        try:
+            input_scan = await self.guardrails.scan_input(question)
+        except BaseException:
+            if retrieval is not None:
+                retrieval.cancel()
+            raise
+        
+        if not input_scan.get("is_valid", True):
+            logger.warning(f"Query blocked by guardrails: {input_scan.get('blocked_reason', 'unknown')}")
+            if retrieval is not None:
+                retrieval.cancel()
+                # Retrieve (and drop) the outcome so a failed search is not logged as unhandled
+                await asyncio.gather(retrieval, return_exceptions=True)
+            return input_scan, None, None
+        
+        embedding, results = await retrieval if retrieval is not None else await self._retrieve(question, top_k)
+        return input_scan, embedding, results
+    
+    async def _answer_cache_version(self) -> int:
+        """Answer cache version after picking up collection changes made elsewhere"""
+        if self.answer_cache.needs_refresh():
+            try:
+                count = await self.qdrant.count(config.collection_name)
+                await asyncio.to_thread(self.answer_cache.refresh, count)
+            except httpx.HTTPError as e:
+                logger.warning(f"Answer cache refresh failed: {e}")
+        return self.answer_cache.version
+    
+    async def query(self, question: str, top_k: int = None) -> dict:
+        """Full RAG query with Guardrails protection (see RAGPipeline.query)"""
+        top_k = top_k or config.top_k
+        cache_version = await self._answer_cache_version()
+        input_scan, embedding, results = await self._guarded_retrieval(question, top_k)
+        
+        if results is None:
+            return blocked_response(input_scan)
+        
+        if not results:
+            return no_context_response(input_scan)
+        
+        cached = await asyncio.to_thread(self.answer_cache.lookup, embedding, top_k, input_scan)
+        if cached is not None:
+            return cached
+        
+        context, sources = build_context(results)
+        raw_answer = await self.ollama.chat(build_user_prompt(context, question), system=SYSTEM_PROMPT)
+        output_scan = await self.guardrails.scan_output(question, raw_answer)
+        
+        response = answer_response(raw_answer, input_scan, output_scan, sources, context)
+        if not response["blocked"]:
+            self.answer_cache.store(embedding, top_k, response, cache_version)
+        return response
+    
+    async def query_stream(self, question: str, top_k: int = None) -> AsyncIterator[dict]:
+        """
+        Streaming RAG query, yields events:
+        
+        - {"type": "blocked", ...} if the input scan blocks (stream ends)
+        - {"type": "sources", "sources": [...]}
+        - {"type": "token", "text": ...} sanitized answer text
+        - {"type": "done", "blocked": ..., "guardrails": {...}}
+        
+        Tokens are buffered into sentence-sized segments (see
+        split_stream_segment) and each segment goes through the output scan
+        before it is released, so PII redaction still applies. Generation
+        keeps running while earlier segments are being scanned.
+        """
+        top_k = top_k or config.top_k
+        await self._answer_cache_version()
+        input_scan, embedding, results = await self._guarded_retrieval(question, top_k)
+        
+        if results is None:
+            yield {"type": "blocked", **blocked_response(input_scan)}
+            return
+        
+        if not results:
+            yield {"type": "done", **no_context_response(input_scan)}
+            return
+        
+        cached = await asyncio.to_thread(self.answer_cache.lookup, embedding, top_k, input_scan)
+        if cached is not None:
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "text": cached["answer"]}
+            yield {"type": "done", "blocked": False, "guardrails": cached["guardrails"], "cache": cached["cache"]}
+            return
+        
+        context, sources = build_context(results)
+        yield {"type": "sources", "sources": sources}
+        
+        segments: asyncio.Queue = asyncio.Queue()
+        
+        async def generate():
+            buffer = ""
+            try:
+                async for token in self.ollama.chat_stream(build_user_prompt(context, question), system=SYSTEM_PROMPT):
+                    buffer += token
+                    segment, buffer = split_stream_segment(
+                        buffer, config.stream_scan_min_chars, config.stream_holdback_max_chars
+                    )
+                    if segment:
+                        await segments.put(segment)
+                if buffer:
+                    await segments.put(buffer)
+            finally:
+                await segments.put(None)
+        
+        generator = asyncio.create_task(generate())
+        scans = []
+        try:
+            while True:
+                segment = await segments.get()
+                if segment is None:
+                    break
+                output_scan = await self.guardrails.scan_output(question, segment)
+                scans.append((segment, output_scan))
+                yield {"type": "token", "text": output_scan.get("sanitized", segment)}
+            # Surface generation errors after the stream drained
+            await generator
+        finally:
+            generator.cancel()
+        
+        output_blocked = any(
+            not scan.get("is_valid", True) and scan.get("risk_score", 0) > 0.9 for _, scan in scans
+        )
+        yield {
+            "type": "done",
+            "blocked": output_blocked,
+            "guardrails": {
+                "input_scan": scan_summary(input_scan),
+                "output_scan": {
+                    "segments": len(scans),
+                    "is_valid": all(scan.get("is_valid", True) for _, scan in scans),
+                    "risk_score": max((scan.get("risk_score") or 0 for _, scan in scans), default=0),
+                    "latency_ms": sum(scan.get("latency_ms") or 0 for _, scan in scans),
+                    "pii_redacted": any(scan.get("sanitized", segment) != segment for segment, scan in scans)
+                }
+            }
+        }
+    
+    async def stats(self) -> dict:
+        """Get collection statistics"""
+        count, collections, guardrails_available = await asyncio.gather(
+            self.qdrant.count(config.collection_name),
+            self.qdrant.get_collections(),
+            self.guardrails.is_available()
+        )
+        
+        return stats_response(
+            count, collections, guardrails_available, self.http.stats(),
+            {"embeddings": self.embedding_cache.stats(), "answers": self.answer_cache.stats()}
+        )
+    
+    async def clear(self):
+        """Clear the collection"""
+        if await self.qdrant.collection_exists(config.collection_name):
+            await self.qdrant.delete_collection(config.collection_name)
+        await self.ensure_collection()
+        self.answer_cache.invalidate()
         return {"status": "cleared", "collection": config.collection_name}
+    
+    async def aclose(self):
+        await self.http.aclose()
 
 
 # =============================================================================
@@ -487,25 +1906,35 @@ if FASTAPI_AVAILABLE:
         top_k: Optional[int] = 5
     
     # Initialize RAG pipeline (lazy loading)
-    _rag: Optional[RAGPipeline] = None
+    _rag: Optional[AsyncRAGPipeline] = None
+    _rag_lock = asyncio.Lock()
     
-    def get_rag() -> RAGPipeline:
+    async def get_rag() -> AsyncRAGPipeline:
         global _rag
         if _rag is None:
-            _rag = RAGPipeline()
+            async with _rag_lock:
+                if _rag is None:
+                    rag = AsyncRAGPipeline()
+                    await rag.ensure_collection()
+                    _rag = rag
         return _rag
     
+    @app.on_event("shutdown")
+    async def shutdown():
+        if _rag is not None:
+            await _rag.aclose()
+    
     @app.get("/")
-    def root():
+    async def root():
         """Health check"""
         return {"status": "ok", "service": "rag-api", "version": "2.0.0", "guardrails": config.guardrails_enabled}
     
     @app.get("/health")
-    def health():
+    async def health():
         """Health check endpoint"""
         try:
-            rag = get_rag()
-            stats = rag.stats()
+            rag = await get_rag()
+            stats = await rag.stats()
             return {
                 "status": "healthy",
                 "qdrant": "connected",
@@ -516,32 +1945,32 @@ if FASTAPI_AVAILABLE:
             return JSONResponse(status_code=503, content={"status": "unhealthy", "error": str(e)})
     
     @app.get("/stats")
-    def stats():
+    async def stats():
         """Get collection statistics"""
         try:
-            return get_rag().stats()
+            return await (await get_rag()).stats()
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
     @app.post("/ingest")
-    def ingest(request: IngestRequest):
+    async def ingest(request: IngestRequest):
         """Ingest text into the vector database"""
         try:
-            return get_rag().ingest_text(request.text, request.source, request.metadata)
+            return await (await get_rag()).ingest_text(request.text, request.source, request.metadata)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
     @app.post("/search")
-    def search(request: SearchRequest):
+    async def search(request: SearchRequest):
         """Search for relevant chunks"""
         try:
-            results = get_rag().search(request.query, request.top_k)
+            results = await (await get_rag()).search(request.query, request.top_k)
             return {"results": results, "count": len(results)}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
     @app.post("/query")
-    def query(request: QueryRequest):
+    async def query(request: QueryRequest):
         """
         Full RAG query with Guardrails protection.
         
@@ -554,15 +1983,39 @@ if FASTAPI_AVAILABLE:
         Response includes guardrails metadata showing what was scanned/blocked.
         """
         try:
-            return get_rag().query(request.question, request.top_k)
+            return await (await get_rag()).query(request.question, request.top_k)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
+    @app.post("/query/stream")
+    async def query_stream(request: QueryRequest):
+        """
+        Streaming RAG query (NDJSON, one event per line).
+        
+        Same guardrails as /query: the input scan gates generation, and the
+        answer is released in sentence-sized segments that have each passed
+        the output (PII) scan.
+        """
+        try:
+            rag = await get_rag()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        async def events():
+            try:
+                async for event in rag.query_stream(request.question, request.top_k):
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                logger.error(f"Streaming query failed: {e}")
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+    
     @app.post("/clear")
-    def clear():
+    async def clear():
         """Clear the collection"""
         try:
-            return get_rag().clear()
+            return await (await get_rag()).clear()
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -573,10 +2026,27 @@ if FASTAPI_AVAILABLE:
 
 if __name__ == "__main__":
     import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="RAG API with Guardrails")
+    subparsers = parser.add_subparsers(dest="command", help="Commands")
+    subparsers.add_parser("serve", help="Run the API server")
+    subparsers.add_parser("stats", help="Show collection stats")
+    query_parser = subparsers.add_parser("query", help="Query the RAG")
+    query_parser.add_argument("question", nargs="+", help="Question to ask")
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest documents")
+    ingest_parser.add_argument("files", nargs="+", help="Files, directories or glob patterns to ingest")
+    ingest_parser.add_argument("-w", "--workers", "--parallel", type=int, default=1,
+                               help="Pipelined parallel ingestion with N workers")
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+    
+    if args.command == "serve":
         if not FASTAPI_AVAILABLE:
-            print("FastAPI not installed. Run: pip install fastapi uvicorn")
+            print("FastAPI not installed. Run: pip install fastapi uvicorn httpx")
             sys.exit(1)
         import uvicorn
         port = int(os.getenv("PORT", "8000"))
@@ -585,19 +2055,11 @@ if __name__ == "__main__":
         # CLI mode
         rag = RAGPipeline()
         
-        if len(sys.argv) < 2:
-            print("Usage: python rag_api.py [serve|stats|query <question>|ingest <file>]")
-            sys.exit(1)
-        
-        cmd = sys.argv[1]
-        
-        if cmd == "stats":
-            import json
+        if args.command == "stats":
             print(json.dumps(rag.stats(), indent=2))
         
-        elif cmd == "query" and len(sys.argv) > 2:
-            question = " ".join(sys.argv[2:])
-            result = rag.query(question)
+        elif args.command == "query":
+            result = rag.query(" ".join(args.question))
             
             if result.get("blocked"):
                 print(f"\n🚫 Query BLOCKED: {result.get('blocked_reason')}")
@@ -612,13 +2074,5 @@ if __name__ == "__main__":
                 print(f"   Input scan: {result['guardrails'].get('input_scan', {})}")
                 print(f"   Output scan: {result['guardrails'].get('output_scan', {})}")
         
-        elif cmd == "ingest" and len(sys.argv) > 2:
-            for filepath in sys.argv[2:]:
-                with open(filepath, "r") as f:
-                    text = f.read()
-                result = rag.ingest_text(text, os.path.basename(filepath))
-                print(f"✅ {result['source']}: {result['chunks']} chunks")
-        
-        else:
-            print("Unknown command")
-            sys.exit(1)
+        elif args.command == "ingest":
+            print_ingest_summary(rag.ingest_files(args.files, args.workers))
@@ -4,12 +4,209 @@ author: Z3ROX
 version: 3.0
 license: MIT
 description: Hybrid keyword + ML prompt injection detection and PII filtering
+requirements: httpx
 """
 
 import re
-from typing import List, Optional
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
-import requests
+import httpx
+
+
+class KeywordMatcher:
+    """
+    Single-pass matcher for anchor[.*tail] keyword rules.
+
+    All anchors are compiled into one alternation and found in a single
+    finditer pass. A rule with a tail matches when its tail starts after
+    the anchor on the line the anchor ends on (the semantics of
+    `anchor.*tail` without DOTALL: `\s*` inside the anchor or the tail may
+    still cross newlines); each (rule, line) tail check runs at most once,
+    so a long document costs one pass plus at most one bounded search per
+    rule and line, instead of one backtracking `.*` scan per rule and anchor.
+    """
+
+    def __init__(self, rules: List[Tuple[str, str, Optional[str]]], flags: int = re.IGNORECASE):
+        self.rule_ids = [rule_id for rule_id, _, _ in rules]
+        # Tail anywhere before the next newline; the tail itself may run past it
+        self._tails = [re.compile(rf"[^\n]*?(?:{tail})", flags) if tail else None for _, _, tail in rules]
+
+        anchor_groups = {}  # anchor pattern -> group name
+        self._group_rules = {}  # group name -> rule indexes sharing that anchor
+        for index, (_, anchor, _) in enumerate(rules):
+            group = anchor_groups.setdefault(anchor, f"a{len(anchor_groups)}")
+            self._group_rules.setdefault(group, []).append(index)
+        # Hoist a shared leading \b so the alternation is only tried at word boundaries
+        boundary = r"\b" if all(anchor.startswith(r"\b") for anchor in anchor_groups) else ""
+        alternation = "|".join(
+            f"(?P<{group}>{anchor[len(boundary):]})" for anchor, group in anchor_groups.items()
+        )
+        self._anchors = re.compile(f"{boundary}(?:{alternation})", flags)
+
+    def match(self, text: str) -> List[str]:
+        """Ids of all rules matching text, in rule order"""
+        matched = set()
+        failed_until = {}  # rule index -> end of the line where its tail was not found
+        line_end = -1
+
+        for m in self._anchors.finditer(text):
+            # Anchors spanning a newline (\s*) continue on the line they end on
+            if m.end() > line_end:
+                line_end = text.find("\n", m.end())
+                if line_end == -1:
+                    line_end = len(text)
+
+            for index in self._group_rules[m.lastgroup]:
+                if index in matched or failed_until.get(index) == line_end:
+                    continue
+                tail = self._tails[index]
+                if tail is None or tail.match(text, m.end()):
+                    matched.add(index)
+                else:
+                    failed_until[index] = line_end
+
+            if len(matched) == len(self.rule_ids):
+                break
+
+        return [self.rule_ids[index] for index in sorted(matched)]
+
+
+class ScanCache:
+    """Bounded LRU of scan results keyed by content hash (ttl 0 = no expiry)"""
+
+    def __init__(self, max_size: int, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, text: str):
+        key = self.key(text)
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > time.time()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, text: str, value):
+        if self.max_size <= 0:
+            return
+        key = self.key(text)
+        self._entries[key] = (time.time() + self.ttl if self.ttl > 0 else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits}/{lookups} hits ({rate:.0%}), {len(self._entries)} entries"
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Call rejected without trying: the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open
+    rejects calls immediately for `reset_timeout` seconds; then half-open
+    lets a single probe through (success closes, failure re-opens).
+
+    timeout() adapts to the guardrails latency: the `percentile` of recent
+    successful calls times `multiplier`, clamped to [timeout_min,
+    timeout_max] (timeout_max until 20 samples exist). Runs on the
+    pipelines event loop, so no locking is needed.
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, timeout_min: float, timeout_max: float,
+                 percentile: float = 0.99, multiplier: float = 3.0, window: int = 200):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.timeout_min = timeout_min
+        self.timeout_max = timeout_max
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self._latencies: List[float] = []
+        self._window = window
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.time() - self._opened_at >= self.reset_timeout:
+            self.state = "half-open"
+            self._probe_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency: float):
+        self._latencies.append(latency)
+        del self._latencies[:-self._window]
+        self._failures = 0
+        self._probe_in_flight = False
+        if self.state != "closed":
+            print("[LLM Guard] Circuit closed - guardrails-api recovered")
+        self.state = "closed"
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == "half-open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                print(f"[LLM Guard] Circuit open for {self.reset_timeout:.0f}s after {self._failures} failures")
+            self.state = "open"
+            self._opened_at = time.time()
+
+    def release_probe(self):
+        """Call ended without a verdict (e.g. cancelled): free the half-open probe slot"""
+        if self.state == "half-open":
+            self._probe_in_flight = False
+
+    def record(self, healthy: Optional[bool], latency: float):
+        """Outcome of an allowed call; None (no verdict) only releases the probe"""
+        if healthy:
+            self.record_success(latency)
+        elif healthy is False:
+            self.record_failure()
+        else:
+            self.release_probe()
+
+    def timeout(self) -> float:
+        if len(self._latencies) < self.MIN_SAMPLES:
+            return self.timeout_max
+        samples = sorted(self._latencies)
+        observed = samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+        return min(self.timeout_max, max(self.timeout_min, observed * self.multiplier))
+
+    def stats(self) -> str:
+        return (f"state={self.state}, opened {self.opened}x, {self.rejected} rejected, "
+                f"timeout={self.timeout():.1f}s")
 
 
 class Pipeline:
@@ -19,46 +216,204 @@ class Pipeline:
         guardrails_url: str = "http://guardrails-api.ai-inference.svc.cluster.local:8000"
         enabled: bool = True
         block_on_detection: bool = True
-
-    # Injection keywords - triggers ML scan
-    INJECTION_KEYWORDS = [
-        r"\bignore\b.*\binstructions?\b",
-        r"\bsystem\s*prompt\b",
-        r"\byou\s*are\s*now\b",
-        r"\bact\s*as\b.*\bno\s*restrict",
-        r"\bjailbreak\b",
-        r"\bDAN\b",
-        r"\bbypass\b.*\b(filter|guard|safe|restrict)",
-        r"\bpretend\b.*\b(evil|unrestrict|no\s*rules)",
-        r"\bforget\b.*\b(rules|instructions|previous)",
-        r"\bdisregard\b.*\b(previous|above|all)",
-        r"\boverride\b.*\b(safe|policy|rules)",
-        r"\bdo\s*anything\s*now\b",
-        r"\brole\s*play\b.*\b(evil|hack|malicious)",
-        r"\brepeat\b.*\bsystem\b",
-        r"\breveal\b.*\b(prompt|instructions|config)",
+        request_timeout: float = 30.0  # seconds, including time queued for a slot (adaptive timeout ceiling)
+        connect_timeout: float = 5.0
+        timeout_min: float = 2.0  # adaptive timeout floor
+        timeout_percentile: float = 0.99  # adaptive timeout = p99 latency x multiplier
+        timeout_multiplier: float = 3.0
+        breaker_failures: int = 5  # consecutive failures that open the circuit
+        breaker_reset_seconds: float = 30.0  # open -> half-open probe
+        inlet_failure_policy: str = "closed"  # guardrails unreachable + keywords: "closed" blocks (if block_on_detection), "open" allows
+        outlet_failure_policy: str = "open"  # guardrails unreachable: "open" returns as-is, "closed" withholds
+        max_concurrency: int = 16  # in-flight guardrails calls across all users
+        max_connections: int = 32
+        output_cache_size: int = 2048  # cleared messages (history is resent every turn)
+        scan_history: bool = False  # also sanitize earlier assistant messages (cached, so usually free)
+        verdict_cache_size: int = 1024  # inlet ML verdicts (regenerations/edits resend the same message)
+        verdict_cache_ttl: int = 600  # seconds
+        verdict_cache_redis_url: str = ""  # optional shared cache across pipelines replicas, e.g. redis://redis:6379/0
+
+    # Injection keyword rules - trigger ML scan
+    # (rule id, anchor, tail that must follow the anchor on the same line)
+    INJECTION_RULES = [
+        ("ignore_instructions", r"\bignore\b", r"\binstructions?\b"),
+        ("system_prompt", r"\bsystem\s*prompt\b", None),
+        ("you_are_now", r"\byou\s*are\s*now\b", None),
+        ("act_unrestricted", r"\bact\s*as\b", r"\bno\s*restrict"),
+        ("jailbreak", r"\bjailbreak\b", None),
+        ("dan", r"\bDAN\b", None),
+        ("bypass_filter", r"\bbypass\b", r"\b(filter|guard|safe|restrict)"),
+        ("pretend_unrestricted", r"\bpretend\b", r"\b(evil|unrestrict|no\s*rules)"),
+        ("forget_rules", r"\bforget\b", r"\b(rules|instructions|previous)"),
+        ("disregard_previous", r"\bdisregard\b", r"\b(previous|above|all)"),
+        ("override_policy", r"\boverride\b", r"\b(safe|policy|rules)"),
+        ("do_anything_now", r"\bdo\s*anything\s*now\b", None),
+        ("roleplay_malicious", r"\brole\s*play\b", r"\b(evil|hack|malicious)"),
+        ("repeat_system", r"\brepeat\b", r"\bsystem\b"),
+        ("reveal_prompt", r"\breveal\b", r"\b(prompt|instructions|config)"),
     ]
 
+    # Equivalent standalone regexes (one per rule)
+    INJECTION_KEYWORDS = [anchor + (f".*{tail}" if tail else "") for _, anchor, tail in INJECTION_RULES]
+
     def __init__(self):
         self.type = "filter"
         self.id = "llmguard_filter"
         self.name = "LLM Guard Security Filter"
         self.valves = self.Valves()
-        self._patterns = [re.compile(p, re.IGNORECASE) for p in self.INJECTION_KEYWORDS]
+        self._matcher = KeywordMatcher(self.INJECTION_RULES)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._breaker = self._new_breaker()
+        self._output_cache = ScanCache(self.valves.output_cache_size)
+        self._verdict_cache = ScanCache(self.valves.verdict_cache_size, self.valves.verdict_cache_ttl)
+        self._redis = None
+        self._shared_hits = 0
 
     async def on_startup(self):
+        self._open_client()
+        self._breaker = self._new_breaker()
+        self._verdict_cache.max_size = self.valves.verdict_cache_size
+        self._verdict_cache.ttl = self.valves.verdict_cache_ttl
+        if self.valves.verdict_cache_redis_url:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.from_url(self.valves.verdict_cache_redis_url)
+            except ImportError:
+                print("[LLM Guard] redis package not installed - shared verdict cache disabled")
         print(f"[LLM Guard] Started v3.0 (hybrid) - URL: {self.valves.guardrails_url}")
 
     async def on_shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        print(f"[LLM Guard] Verdict cache: {self._verdict_cache.stats()}, {self._shared_hits} shared hits")
+        print(f"[LLM Guard] Output cache: {self._output_cache.stats()}")
+        print(f"[LLM Guard] Circuit breaker: {self._breaker.stats()}")
         print("[LLM Guard] Shutdown")
 
+    def _open_client(self):
+        """Pooled async client + concurrency limit (keep-alive connections to guardrails-api)"""
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.valves.request_timeout, connect=self.valves.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.valves.max_connections,
+                max_keepalive_connections=self.valves.max_concurrency
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.valves.max_concurrency)
+
+    def _new_breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(
+            self.valves.breaker_failures,
+            self.valves.breaker_reset_seconds,
+            self.valves.timeout_min,
+            self.valves.request_timeout,
+            self.valves.timeout_percentile,
+            self.valves.timeout_multiplier
+        )
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        """
+        POST to guardrails-api without blocking the event loop, through the
+        circuit breaker and with its adaptive timeout; raises httpx.HTTPError
+        (CircuitOpenError when the call was not attempted).
+        """
+        if self._client is None:
+            self._open_client()
+        if not self._breaker.allow():
+            raise CircuitOpenError(f"guardrails circuit open, {path} not attempted")
+
+        timeout = self._breaker.timeout()
+
+        async def send() -> dict:
+            async with self._semaphore:
+                response = await self._client.post(
+                    f"{self.valves.guardrails_url}{path}",
+                    json=payload,
+                    timeout=httpx.Timeout(timeout, connect=self.valves.connect_timeout)
+                )
+                response.raise_for_status()
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise httpx.DecodingError(f"{path}: invalid JSON response: {e}", request=response.request)
+
+        start = time.time()
+        healthy = None  # stays None if cancelled mid-call
+        try:
+            result = await asyncio.wait_for(send(), timeout=timeout)
+            healthy = True
+            return result
+        except asyncio.TimeoutError:
+            healthy = False
+            raise httpx.TimeoutException(f"{path} timed out after {timeout:.1f}s")
+        except httpx.HTTPStatusError as e:
+            # A 4xx is this request's own fault, not a sign guardrails-api is struggling
+            healthy = e.response.status_code < 500
+            raise
+        except httpx.HTTPError:
+            healthy = False
+            raise
+        finally:
+            self._breaker.record(healthy, time.time() - start)
+
     def _has_injection_keywords(self, text: str) -> list:
-        """Check if text contains injection-related keywords"""
-        matched = []
-        for pattern in self._patterns:
-            if pattern.search(text):
-                matched.append(pattern.pattern)
-        return matched
+        """Ids of the injection keyword rules matching text (single pass)"""
+        return self._matcher.match(text)
+
+    async def _scan_input(self, content: str) -> Tuple[dict, bool]:
+        """
+        /scan/input verdict for a message, returns (result, cached).
+
+        Checks the local LRU, then the shared Redis cache (if configured),
+        and only then calls guardrails-api. Errors are never cached.
+        """
+        result = self._verdict_cache.get(content)
+        if result is not None:
+            return result, True
+
+        key = f"llmguard:verdict:{ScanCache.key(content)}"
+        if self._redis is not None:
+            try:
+                shared = await self._redis.get(key)
+                if shared is not None:
+                    result = json.loads(shared)
+                    self._verdict_cache.put(content, result)
+                    self._shared_hits += 1
+                    return result, True
+            except Exception as e:
+                print(f"[LLM Guard] Warning - shared verdict cache unavailable: {e}")
+
+        result = await self._post("/scan/input", {"prompt": content})
+        self._verdict_cache.put(content, result)
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, json.dumps(result), ex=self.valves.verdict_cache_ttl)
+            except Exception as e:
+                print(f"[LLM Guard] Warning - shared verdict cache unavailable: {e}")
+        return result, False
+
+    async def _scan_output(self, prompt: str, content: str) -> str:
+        """
+        Sanitized content of a complete message, in a single /scan/output
+        call; messages seen before (resent history) are free.
+        """
+        self._output_cache.max_size = self.valves.output_cache_size
+        cached = self._output_cache.get(content)
+        if cached is not None:
+            return cached
+
+        result = await self._post("/scan/output", {"prompt": prompt, "output": content})
+        sanitized = result.get("sanitized", content)
+
+        # The sanitized text is what comes back in the next turn's history
+        self._output_cache.put(content, sanitized)
+        self._output_cache.put(sanitized, sanitized)
+        return sanitized
 
     async def inlet(self, body: dict, user: Optional[dict] = None) -> dict:
         """Filter incoming messages - hybrid keyword + ML detection"""
@@ -90,18 +445,13 @@ class Pipeline:
 
         # Step 2: ML scan only if keywords found
         try:
-            response = requests.post(
-                f"{self.valves.guardrails_url}/scan/input",
-                json={"prompt": content},
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
+            result, cached = await self._scan_input(content)
 
             is_valid = result.get("is_valid", True)
             risk_score = result.get("risk_score", 0)
 
-            print(f"[LLM Guard] User: {user_name}, ML scan: Valid={is_valid}, Risk={risk_score}")
+            source = "cached verdict" if cached else "ML scan"
+            print(f"[LLM Guard] User: {user_name}, {source}: Valid={is_valid}, Risk={risk_score}")
 
             if not is_valid and self.valves.block_on_detection:
                 scanners = result.get("scanners", [])
@@ -113,10 +463,11 @@ class Pipeline:
             if is_valid:
                 print(f"[LLM Guard] User: {user_name}, Keywords matched but ML passed - allowing")
 
-        except requests.exceptions.RequestException as e:
-            # Fail-closed when keywords detected but API unreachable
+        except httpx.HTTPError as e:
+            # Keywords detected but API unreachable: inlet_failure_policy decides
+            # (only when blocking is enabled at all)
             print(f"[LLM Guard] WARNING - API unreachable with suspicious keywords: {e}")
-            if self.valves.block_on_detection:
+            if self.valves.block_on_detection and self.valves.inlet_failure_policy == "closed":
                 raise Exception("🛡️ Security scan unavailable - suspicious content blocked")
 
         return body
@@ -134,32 +485,123 @@ class Pipeline:
         if last_message.get("role") != "assistant":
             return body
 
-        content = last_message.get("content", "")
-        if not content:
+        if not last_message.get("content", ""):
             return body
 
         prompt = ""
-        for msg in reversed(messages[:-1]):
+        for index, msg in enumerate(messages):
             if msg.get("role") == "user":
                 prompt = msg.get("content", "")
-                break
-
-        try:
-            response = requests.post(
-                f"{self.valves.guardrails_url}/scan/output",
-                json={"prompt": prompt, "output": content},
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
+                continue
+
+            content = msg.get("content", "")
+            if msg.get("role") != "assistant" or not content:
+                continue
+            if index != len(messages) - 1 and not self.valves.scan_history:
+                continue
+
+            try:
+                sanitized = await self._scan_output(prompt, content)
+                if sanitized != content:
+                    print("[LLM Guard] PII redacted from response")
+                    messages[index]["content"] = sanitized
+
+            except httpx.HTTPError as e:
+                print(f"[LLM Guard] Warning - Output scan failed: {e}")
+                if self.valves.outlet_failure_policy == "closed":
+                    messages[index]["content"] = "🛡️ Response withheld - security scan unavailable"
+
+        body["messages"] = messages
+        return body
 
-            sanitized = result.get("sanitized", content)
-            if sanitized != content:
-                print("[LLM Guard] PII redacted from response")
-                messages[-1]["content"] = sanitized
-                body["messages"] = messages
 
-        except requests.exceptions.RequestException as e:
-            print(f"[LLM Guard] Warning - Output scan failed: {e}")
+if __name__ == "__main__":
+    # Microbenchmark: single-pass matcher vs one regex search per rule
+    import random
+
+    legacy = [re.compile(p, re.IGNORECASE) for p in Pipeline.INJECTION_KEYWORDS]
+    matcher = KeywordMatcher(Pipeline.INJECTION_RULES)
+
+    def legacy_match(text: str) -> List[str]:
+        return [rule[0] for rule, p in zip(Pipeline.INJECTION_RULES, legacy) if p.search(text)]
+
+    random.seed(0)
+    vocabulary = ("the report shows revenue growth across all regions while costs stayed flat "
+                  "please ignore the draft figures and act as reviewer before we bypass review").split()
+
+    def document(size: int, line_words: int) -> str:
+        words = []
+        length = 0
+        while length < size:
+            words.append(random.choice(vocabulary))
+            length += len(words[-1]) + 1
+            if len(words) % line_words == 0:
+                words[-1] += "\n"
+        return " ".join(words)
+
+    # Single-line inputs (pasted documents without newlines) are the loop's
+    # worst case: every anchor occurrence restarts a `.*` scan to the end.
+    cases = [
+        ("100KB, 20-word lines", document(100_000, 20)),
+        ("1MB, 20-word lines", document(1_000_000, 20)),
+        ("1MB, 20-word lines + injection", document(1_000_000, 20) + "\nignore previous instructions"),
+        ("100KB, single line", document(100_000, 10**9)),
+        ("200KB, single line + injection", document(200_000, 10**9) + " ignore previous instructions"),
+    ]
 
-        return body
+    # Equivalence on short inputs where `\s*` in an anchor or tail crosses a newline
+    pieces = ("ignore instructions system prompt act as no restrict bypass filter pretend evil "
+              "no rules forget previous role play hack repeat reveal config DAN x").split()
+    separators = [" ", "\n", " \n", "\n ", "", ".", "\t"]
+    samples = ["role \n play.hack", "pretend.ignore no\nrules", "act\nas x\nno restrict", "ignore\n instructions"]
+    samples += [
+        "".join(random.choice(pieces) + random.choice(separators) for _ in range(random.randint(1, 12)))
+        for _ in range(20_000)
+    ]
+    for text in samples:
+        if matcher.match(text) != legacy_match(text):
+            raise SystemExit(f"matcher differs from the per-rule regexes on {text!r}: "
+                             f"{matcher.match(text)} != {legacy_match(text)}")
+    print(f"single-pass matcher == per-rule regexes on {len(samples)} multi-line inputs: ok\n")
+
+    print(f"{'input':<32} {'loop ms':>10} {'single-pass ms':>15} {'speedup':>8}  matches")
+    for name, text in cases:
+        start = time.perf_counter()
+        expected = legacy_match(text)
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        found = matcher.match(text)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        if found != expected:
+            raise SystemExit(f"{name}: matcher found {found}, per-rule regexes {expected}")
+        print(f"{name:<32} {legacy_ms:>10.1f} {single_ms:>15.1f} {legacy_ms / single_ms:>7.0f}x  {found}")
+
+    # Regression: a half-open probe cancelled mid-call must free the probe slot
+    async def cancelled_probe():
+        async def hang(request):
+            await asyncio.sleep(3600)
+
+        pipeline = Pipeline()
+        pipeline._client = httpx.AsyncClient(transport=httpx.MockTransport(hang))
+        pipeline._semaphore = asyncio.Semaphore(1)
+        pipeline._breaker = CircuitBreaker(1, 0.0, 1.0, 30.0)
+        pipeline._breaker.record_failure()
+
+        probe = asyncio.ensure_future(pipeline._post("/scan/input", {"prompt": "x"}))
+        await asyncio.sleep(0.05)
+        if pipeline._breaker.state != "half-open" or pipeline._breaker.allow():
+            raise SystemExit(f"probe in flight, expected a closed half-open slot: {pipeline._breaker.stats()}")
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        released = pipeline._breaker.allow()
+        await pipeline._client.aclose()
+        if not released:
+            raise SystemExit("cancelled probe still holds the half-open slot")
+
+    asyncio.run(cancelled_probe())
+    print("cancelled half-open probe releases the slot: ok")